@@ -0,0 +1,97 @@
+# Sofia Deichert - Code Transformation Project
+# Check that transformed ASTs survive save_ast -> load_ast
+# (loaded AST has transformed code as root text and nodes with the same text they had when saved)
+# (runs on the test jsonl files by default)
+
+import argparse
+import os
+import tempfile
+
+import orjson
+
+from extract_ast import parse_to_table
+from transform_ast import AST_TRANSFORMATIONS
+from transformations.ast_io import has_stale_nodes, load_ast, restore_ast, save_ast
+
+TEST_FILES = ["test_compound.jsonl", "test_modulo_compound.jsonl", "test_relation.jsonl", "test_if_else_if.jsonl"]
+
+def node_texts(ast_json):
+    """(type, start, end, text) of every node in pre-order (positions relative to root start)"""
+    base = ast_json["start_byte"]
+    nodes = []
+    stack = [ast_json]
+    while stack:
+        node = stack.pop()
+        nodes.append((node["type"], node["start_byte"] - base, node["end_byte"] - base, node["text"]))
+        stack.extend(reversed(node.get("children", ())))
+
+    return nodes
+
+def check_roundtrip(ast_json, ast_file_path, pretty):
+    """
+    Save AST, load it again and compare with AST that was saved
+
+    Returns:
+        error message, None if AST round-trips
+    """
+    text = ast_json["text"]
+    save_ast(ast_json, ast_file_path, pretty)
+    loaded = load_ast(ast_file_path)
+
+    if loaded["text"] != text:
+        return "root text changed"
+
+    # nodes that no longer matched root text are left out when saving -> only root is left
+    if not loaded["children"]:
+        if not has_stale_nodes(ast_json):
+            return "nodes left out"
+        return None
+
+    # every node is loaded with the same position and text it had before saving
+    if node_texts(loaded) != node_texts(ast_json):
+        return "nodes don't match saved AST"
+
+    return None
+
+def check_jsonl(input_jsonl, work_dir):
+    """
+    Check every transformation on every record of jsonl file, print failures
+
+    Returns:
+        num of failed checks
+    """
+    ast_file_path = os.path.join(work_dir, "ast.json")
+    failed = 0
+    with open(input_jsonl, 'rb') as f:
+        for line in f:
+            data = orjson.loads(line)
+            ast_bytes = orjson.dumps(parse_to_table(data['input']))
+
+            checks = [("extracted", restore_ast(orjson.loads(ast_bytes)))]
+            for transformation_name, transformation_function in AST_TRANSFORMATIONS.items():
+                checks.append((transformation_name, transformation_function(restore_ast(orjson.loads(ast_bytes)))))
+
+            for name, ast_json in checks:
+                for pretty in (False, True):
+                    error = check_roundtrip(ast_json, ast_file_path, pretty)
+                    if error:
+                        failed += 1
+                        print(f"{input_jsonl} id {data['id']} ({name}, pretty={pretty}): {error}")
+
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that transformed ASTs can be saved and loaded again")
+    parser.add_argument("files", nargs="*", default=TEST_FILES, help="JSONL files to check")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        failed = sum(check_jsonl(input_jsonl, work_dir) for input_jsonl in args.files)
+    print(f"{failed} failed checks" if failed else "All ASTs round-trip")
+
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Sofia Deichert - Code Transformation Project
+# Check that compound_to_expanded_all / expanded_to_compound_all give the same code
+# as running the ten per-operator transformations one after another
+# (runs on the test jsonl files by default)
+
+import argparse
+
+import orjson
+
+from extract_ast import parse_to_table
+from transformations.ast_io import restore_ast
+from transformations.calculation.compound_assignment import (
+    ALL_COMPOUND_OPS,
+    COMPOUND_TO_BINARY,
+    transform_compound_to_expanded,
+    transform_expanded_to_compound,
+    transform_compound_to_expanded_all,
+    transform_expanded_to_compound_all
+)
+
+TEST_FILES = ["test_compound.jsonl", "test_modulo_compound.jsonl"]
+
+def transform_in_turn(code, transformation_functions):
+    """
+    Apply transformations one after another, parsing changed code again in between
+    (node positions are stale after a transformation changed root text)
+    """
+    ast = restore_ast(parse_to_table(code))
+    for transformation_function in transformation_functions:
+        modified_ast = transformation_function(ast)
+        if modified_ast is not ast:
+            modified_ast = restore_ast(parse_to_table(modified_ast["text"]))
+        ast = modified_ast
+
+    return ast["text"]
+
+def check_record(code):
+    """
+    Compare both _all transformations against per-operator ones for single piece of code
+
+    Returns:
+        list of (direction, code from _all transformation, code from per-operator transformations)
+        for each direction where they differ
+    """
+    per_operator = {
+        "compound_to_expanded": (
+            transform_compound_to_expanded_all,
+            [lambda ast, op=op: transform_compound_to_expanded(ast, op) for op in ALL_COMPOUND_OPS]
+        ),
+        "expanded_to_compound": (
+            transform_expanded_to_compound_all,
+            [lambda ast, op=COMPOUND_TO_BINARY[op]: transform_expanded_to_compound(ast, op) for op in ALL_COMPOUND_OPS]
+        ),
+    }
+
+    mismatches = []
+    for direction, (all_function, operator_functions) in per_operator.items():
+        all_code = transform_in_turn(code, [all_function])
+        in_turn_code = transform_in_turn(code, operator_functions)
+        if all_code != in_turn_code:
+            mismatches.append((direction, all_code, in_turn_code))
+
+    return mismatches
+
+def check_jsonl(input_jsonl):
+    """
+    Check every record of jsonl file, print mismatches
+
+    Returns:
+        num of records with a mismatch
+    """
+    failed = 0
+    with open(input_jsonl, 'rb') as f:
+        for line in f:
+            data = orjson.loads(line)
+            for direction, all_code, in_turn_code in check_record(data['input']):
+                failed += 1
+                print(f"{input_jsonl} id {data['id']} ({direction}):")
+                print(f"  _all:         {all_code}")
+                print(f"  per operator: {in_turn_code}")
+
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Check _all compound transformations against per-operator ones")
+    parser.add_argument("files", nargs="*", default=TEST_FILES, help="JSONL files to check")
+
+    args = parser.parse_args()
+
+    failed = sum(check_jsonl(input_jsonl) for input_jsonl in args.files)
+    print(f"{failed} mismatches" if failed else "All records match")
+
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,11 @@
 # Takes separate .cpp files and puts them back into single jsonl file
 # Does opposite of jsonl_to_cpp.py
 
-import json
+import orjson
 import os
-import re
+
+# number of jsonl lines collected before they're written out together
+WRITE_BATCH_SIZE = 512
 
 #Process all .cpp files in input directory and output them to jsonl file
 def process_cpp_directory(input_dir, output_file, original_jsonl=None):
@@ -14,60 +16,58 @@ def process_cpp_directory(input_dir, output_file, original_jsonl=None):
     
     # Get all .cpp files and sort them by their numeric ID
     cpp_files = []
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.cpp'):
-            # Extract ID number from filename (code_XXXX.cpp)
-            match = re.match(r'code_(\d+)\.cpp', filename)
-            if match:
-                file_id = int(match.group(1))
-                cpp_files.append((file_id, filename))
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.startswith('code_') and entry.name.endswith('.cpp'):
+                # Extract ID number from filename (code_XXXX.cpp)
+                id_text = entry.name[5:-4]
+                if id_text.isdecimal():
+                    cpp_files.append((int(id_text), entry.name, entry.path))
     
     # Sort by ID
     cpp_files.sort()
     
-    # Load original JSONL for labels and exact original format
-    original_lines = {}
+    # Load original JSONL for labels and exact original format (parsed once, kept as dicts)
+    original_records = {}
     if original_jsonl and os.path.exists(original_jsonl):
-        with open(original_jsonl, 'r', encoding='utf-8') as original_f:
+        with open(original_jsonl, 'rb') as original_f:
             line_number = 0
             for line in original_f:
                 try:
-                    data = json.loads(line.strip())
+                    data = orjson.loads(line)
                     if 'id' in data:
                         file_id = data['id']
-                        # Store exact original line for each file ID
-                        original_lines[file_id] = line.strip()
-                except json.JSONDecodeError:
+                        # Store original record for each file ID
+                        original_records[file_id] = data
+                except orjson.JSONDecodeError:
                     print(f"Error parsing line {line_number} in original JSONL")
                 line_number += 1
     
-    # Process each file and write to jsonl
-    with open(output_file, 'w', encoding='utf-8') as out_f:
-        for file_id, filename in cpp_files:
-            file_path = os.path.join(input_dir, filename)
-            
+    # Process each file and write to jsonl (large buffer + batched writes instead of one write per line)
+    chunks = []
+    with open(output_file, 'wb', buffering=1 << 20) as out_f:
+        for file_id, filename, file_path in cpp_files:
             try:
                 # Read C++ file exactly as written by jsonl_to_cpp.py
                 with open(file_path, 'r', encoding='utf-8') as cpp_file:
                     code = cpp_file.read()
                 
                 # construct line that matches original format exactly
-                if file_id in original_lines:
-                    # Get original line to use as template
-                    original_line = original_lines[file_id]
-                    
-                    # Extract original data
-                    original_data = json.loads(original_line)
+                if file_id in original_records:
+                    # Get original record to use as template
+                    original_data = original_records[file_id]
                     
-                    # because we did \n -> \\n in jsonl_to_cpp.py 
-                    code = code.replace('\\n', '\n')
+                    # because we did \n -> \\n in jsonl_to_cpp.py
+                    # (only records that had real newlines were changed - others may contain \\n literals)
+                    if '\n' in original_data["input"]:
+                        code = code.replace('\\n', '\n')
                     
                     # Create new data object with updated input
                     new_data = original_data.copy()
                     new_data["input"] = code
                     
-                    # Let json.dumps handle proper escaping
-                    out_f.write(json.dumps(new_data) + '\n')
+                    # Let orjson handle proper escaping
+                    chunks.append(orjson.dumps(new_data, option=orjson.OPT_APPEND_NEWLINE))
                 else:
                     # If we don't have original, create new line
                     # Also fix newline escaping here
@@ -77,12 +77,18 @@ def process_cpp_directory(input_dir, output_file, original_jsonl=None):
                         "label": 0,  # Default label
                         "id": file_id
                     }
-                    out_f.write(json.dumps(json_obj) + '\n')
+                    chunks.append(orjson.dumps(json_obj, option=orjson.OPT_APPEND_NEWLINE))
                 
                 # print(f"Processed file: {filename}")
                 
             except Exception as e:
                 print(f"Error processing file {filename}: {e}")
+
+            if len(chunks) >= WRITE_BATCH_SIZE:
+                out_f.writelines(chunks)
+                chunks.clear()
+
+        out_f.writelines(chunks)
     
     print(f"JSONL file created: {output_file}")
 
@@ -1,64 +1,120 @@
 # Sofia Deichert - Code Transformation Project
 # Extract ASTs from C++ files and save them to new files in json format
 import os
-import json
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from tree_sitter import Language, Parser
 
 # load C++ lang
 import tree_sitter_cpp as tscpp
-CPP_LANGUAGE = Language(tscpp.language())
 
-parser = Parser(CPP_LANGUAGE) # Initialize parser
+from transformations.ast_io import save_ast
 
-# folder to store ASTs
+# parser is created lazily and then reused for every file - one per worker process
+# (tree-sitter parsers can't be pickled)
+@lru_cache(maxsize=1)
+def _get_parser():
+    return Parser(Language(tscpp.language()))
+
+# default folder to store ASTs
 AST_OUTPUT_FOLDER = 'asts'
-os.makedirs('asts', exist_ok=True)  
 
-# convert ast to json-like structure
-def ast_to_json(node):
-    result = {
+# convert single node to json-like dict (children are filled in by ast_to_json)
+# text is not stored per node - it's just root text[start_byte:end_byte]
+def node_to_json(node):
+    return {
         "type": node.type,  # e.g., "function_definition"/"identifier"
         "start_byte": node.start_byte,  # Start byte position in source code
         "end_byte": node.end_byte,  # End byte position in source code
-        "text": node.text.decode("utf-8"),  # Text content of node
         "children": []  # list to store child nodes
     }
 
-    # recursively add child nodes
-    for child in node.children:
-        result["children"].append(ast_to_json(child))
+# convert ast to json-like structure
+# uses an explicit stack instead of recursion (deep ASTs can hit the recursion limit)
+def ast_to_json(root):
+    # text content of whole code (only stored on root) - written first so it can be read without parsing the tree
+    result = {"text": root.text.decode("utf-8")}
+    result.update(node_to_json(root))
+
+    stack = [(root, result)]
+    while stack:
+        node, node_json = stack.pop()
+
+        # add child nodes (in order) and queue them to be expanded
+        for child in node.children:
+            child_json = node_to_json(child)
+            node_json["children"].append(child_json)
+            stack.append((child, child_json))
 
     return result
 
-def extract_ast_from_file(file_path):
+# convert ast to flat node table (format of saved AST files - smaller and faster to write than nested dicts)
+# node i = types[i], starts[i], ends[i]; parents[i] = index of parent node (-1 for root)
+# nodes are in pre-order, so children of each node appear in source order
+# transformations.ast_io.table_to_ast turns it back into nested dicts
+def ast_to_table(root):
+    types, starts, ends, parents = [], [], [], []
+
+    stack = [(root, -1)]
+    while stack:
+        node, parent_index = stack.pop()
+        index = len(types)
+        types.append(node.type)
+        starts.append(node.start_byte)
+        ends.append(node.end_byte)
+        parents.append(parent_index)
+
+        # reversed -> first child is expanded next
+        stack.extend((child, index) for child in reversed(node.children))
+
+    # text first so it can be read without parsing the rest
+    return {"text": root.text.decode("utf-8"), "types": types, "starts": starts, "ends": ends, "parents": parents}
+
+def _parse(code):
+    if isinstance(code, str):
+        code = code.encode('utf-8')
+    return _get_parser().parse(code)
+
+# parse C++ source (str or utf-8 bytes) straight to json-like AST (no files involved)
+def parse_to_ast(code):
+    return ast_to_json(_parse(code).root_node) # ast -> json
+
+# parse C++ source (str or utf-8 bytes) to flat node table
+def parse_to_table(code):
+    return ast_to_table(_parse(code).root_node)
+
+def extract_ast_from_file(file_path, ast_output_folder=AST_OUTPUT_FOLDER, pretty=False):
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            code = file.read()
-            tree = parser.parse(bytes(code, 'utf-8'))
+        # tree-sitter parses bytes -> no need to decode the file first
+        code = Path(file_path).read_bytes()
 
-            # Create corresponding AST file path
-            file_name = os.path.basename(file_path)  # e.g., code_0000.cpp
-            ast_file_name = file_name.replace('.cpp', '.json')  # e.g., code_0000.json
-            ast_file_path = os.path.join(AST_OUTPUT_FOLDER, ast_file_name)
+        # Create corresponding AST file path
+        file_name = os.path.basename(file_path)  # e.g., code_0000.cpp
+        ast_file_name = file_name.replace('.cpp', '.json')  # e.g., code_0000.json
+        ast_file_path = os.path.join(ast_output_folder, ast_file_name)
 
-            ast_json = ast_to_json(tree.root_node) # ast -> json 
+        ast_table = parse_to_table(code)
 
-            # Save AST to json file
-            with open(ast_file_path, 'w', encoding='utf-8') as ast_file:
-                json.dump(ast_json, ast_file, indent=2)
+        # Save AST to json file (compact unless pretty is set)
+        save_ast(ast_table, ast_file_path, pretty)
 
     except Exception as e:
         print(f"Error processing file {file_path}: {e}")
 
-def extract_ast_from_directory(directory):
+def extract_ast_from_directory(directory, ast_output_folder=AST_OUTPUT_FOLDER, pretty=False):
     if not os.path.exists(directory):
         print(f"Directory not found: {directory}")
         return
 
-    for filename in os.listdir(directory):
-        if filename.endswith('.cpp'):
-            file_path = os.path.join(directory, filename)
-            extract_ast_from_file(file_path)
+    os.makedirs(ast_output_folder, exist_ok=True)
+
+    with os.scandir(directory) as entries:
+        file_paths = [entry.path for entry in entries if entry.is_file() and entry.name.endswith('.cpp')]
+
+    # each file is parsed independently -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(partial(extract_ast_from_file, ast_output_folder=ast_output_folder, pretty=pretty), file_paths, chunksize=32))
 
 if __name__ == "__main__":
     # Extract ASTs for all C++ files and save them to 'asts' folder
@@ -1,7 +1,7 @@
 # Sofia Deichert - Code Transformation Project
 # Takes jsonl file input and puts it into separate .cpp files
 
-import json
+import orjson
 import os
 
 
@@ -10,11 +10,11 @@ def process_jsonl_file(input_file, output_dir):
         os.makedirs(output_dir)
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
+        with open(input_file, 'rb') as f:
             # process files for all IDs
             for line in f:
                 try:
-                    data = json.loads(line.strip())  # parse JSON line
+                    data = orjson.loads(line)  # parse JSON line
 
                     # check if ID in desired range
                     if 0 <= data['id'] <= 6763:
@@ -29,7 +29,7 @@ def process_jsonl_file(input_file, output_dir):
 
                         # print(f"Created file: {output_file}")
 
-                except json.JSONDecodeError as e:
+                except orjson.JSONDecodeError as e:
                     print(f"Error parsing JSON line: {e}")
                 except KeyError as e:
                     print(f"Missing required key in JSON: {e}")
@@ -1,14 +1,26 @@
 # Sofia Deichert - Code Transformation Project
 # Reconstruct C++ source code from AST
 
-import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from json.decoder import scanstring
+
+import orjson
+
+# AST files start with root text ({"text": "...", ...}) -> matches up to the opening quote of the text value
+ROOT_TEXT_PREFIX = re.compile(r'\s*\{\s*"text"\s*:\s*"')
 
 
 def reconstruct_source_from_ast(ast_json):
     # convert string -> dict if needed
     if isinstance(ast_json, str):
-        ast_dict = json.loads(ast_json)
+        # fast path: only decode root text string instead of parsing whole tree
+        match = ROOT_TEXT_PREFIX.match(ast_json)
+        if match:
+            return scanstring(ast_json, match.end())[0]
+        ast_dict = orjson.loads(ast_json)
     else:
         ast_dict = ast_json
     
@@ -22,7 +34,7 @@ def reconstruct_and_save(ast_file_path, output_dir="modernized_code"):
     
     # load AST from file
     with open(ast_file_path, 'r', encoding='utf-8') as f:
-        ast_json = json.load(f)
+        ast_json = f.read()
     
     # reconstruct source from ast
     source_code = reconstruct_source_from_ast(ast_json)
@@ -42,14 +54,12 @@ def reconstruct_and_save(ast_file_path, output_dir="modernized_code"):
 # output dir = modernized_code, change as necessary
 # process all AST files in directory + save reconstructed source code
 def process_all_asts(ast_dir="transformed_asts/return_type_deduction", output_dir="return_type_deduction_code"):
-    output_files = []
-    
-    for filename in os.listdir(ast_dir):
-        if filename.endswith('.json'):
-            ast_file_path = os.path.join(ast_dir, filename)
-            output_file = reconstruct_and_save(ast_file_path, output_dir)
-            output_files.append(output_file)
-            # print(f"Reconstructed: {output_file}")
+    with os.scandir(ast_dir) as entries:
+        ast_file_paths = [entry.path for entry in entries if entry.is_file() and entry.name.endswith('.json')]
+    
+    # each AST is reconstructed independently -> spread them across all cores
+    with ProcessPoolExecutor() as executor:
+        output_files = list(executor.map(partial(reconstruct_and_save, output_dir=output_dir), ast_file_paths, chunksize=32))
     
     return output_files
 
@@ -4,152 +4,254 @@
 import os
 import argparse
 import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import orjson
 
 # Add project root to python path (for enabling imports)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from transformations.ast_io import restore_ast, save_ast
+
 # Import transformations
-from transformations.cpp14.return_type_deduction import apply_transformation as apply_return_type_deduction
+from transformations.cpp14.return_type_deduction import transform_return_type_to_auto
 
 # Import unary operator transformations
 from transformations.calculation.unary_operator import (
-    apply_increment_to_assignment_transformation,
-    apply_assignment_to_increment_transformation,
-    apply_decrement_to_assignment_transformation,
-    apply_assignment_to_decrement_transformation
+    transform_increment_to_assignment,
+    transform_assignment_to_increment,
+    transform_decrement_to_assignment,
+    transform_assignment_to_decrement
 )
 
 # Import loop transformations
-from transformations.loop.while_to_for import apply_while_to_for_transformation
-from transformations.loop.for_to_while import apply_for_to_while_transformation
+from transformations.loop.while_to_for import transform_while_to_for
+from transformations.loop.for_to_while import transform_for_to_while, remove_trailing_spaces_before_braces
 
 # Import compound assignment transformations
 from transformations.calculation.compound_assignment import (
-    apply_plus_equal_to_expanded_transformation,
-    apply_expanded_to_plus_equal_transformation,
-    apply_minus_equal_to_expanded_transformation,
-    apply_expanded_to_minus_equal_transformation,
-    apply_multiply_equal_to_expanded_transformation,
-    apply_expanded_to_multiply_equal_transformation,
-    apply_divide_equal_to_expanded_transformation,
-    apply_expanded_to_divide_equal_transformation,
-    apply_modulo_equal_to_expanded_transformation,
-    apply_expanded_to_modulo_equal_transformation,
-    apply_left_shift_equal_to_expanded_transformation,
-    apply_expanded_to_left_shift_equal_transformation,
-    apply_right_shift_equal_to_expanded_transformation,
-    apply_expanded_to_right_shift_equal_transformation,
-    apply_bitand_equal_to_expanded_transformation,
-    apply_expanded_to_bitand_equal_transformation,
-    apply_bitor_equal_to_expanded_transformation,
-    apply_expanded_to_bitor_equal_transformation,
-    apply_bitxor_equal_to_expanded_transformation,
-    apply_expanded_to_bitxor_equal_transformation
+    transform_plus_equal_to_expanded,
+    transform_expanded_to_plus_equal,
+    transform_minus_equal_to_expanded,
+    transform_expanded_to_minus_equal,
+    transform_multiply_equal_to_expanded,
+    transform_expanded_to_multiply_equal,
+    transform_divide_equal_to_expanded,
+    transform_expanded_to_divide_equal,
+    transform_modulo_equal_to_expanded,
+    transform_expanded_to_modulo_equal,
+    transform_left_shift_equal_to_expanded,
+    transform_expanded_to_left_shift_equal,
+    transform_right_shift_equal_to_expanded,
+    transform_expanded_to_right_shift_equal,
+    transform_bitand_equal_to_expanded,
+    transform_expanded_to_bitand_equal,
+    transform_bitor_equal_to_expanded,
+    transform_expanded_to_bitor_equal,
+    transform_bitxor_equal_to_expanded,
+    transform_expanded_to_bitxor_equal,
+    transform_compound_to_expanded_all,
+    transform_expanded_to_compound_all
 )
 
 # Import CLONEGEN transformations
-from transformations.clonegen.ch_rename import apply_ch_rename_transformation
-from transformations.clonegen.ch_relation import apply_relational_transformation
-from transformations.clonegen.ch_define import apply_ch_define_transformation 
-from transformations.clonegen.ch_constant import apply_ch_constant_transformation  
-from transformations.clonegen.ch_if_elseIF import apply_ch_if_elseIF_transformation
+from transformations.clonegen.ch_rename import transform_names
+from transformations.clonegen.ch_relation import transform_relational_expressions
+from transformations.clonegen.ch_define import transform_variable_definitions
+from transformations.clonegen.ch_constant import transform_number_literals
+from transformations.clonegen.ch_if_elseIF import transform_if_elseif
+
+def transform_return_type_deduction(ast):
+    modified_ast, _ = transform_return_type_to_auto(ast)
+    return modified_ast
+
+def transform_for_to_while_with_cleanup(ast):
+    modified_ast = transform_for_to_while(ast)
+    # clean up any trailing spaces before braces in root node
+    return remove_trailing_spaces_before_braces(modified_ast)
+
+# All transformations by name (AST dict -> modified AST dict)
+AST_TRANSFORMATIONS = {
+    # C++14 return type deduction transformation
+    "return_type_deduction": transform_return_type_deduction,
+
+    # Unary operator transformations
+    "increment_to_assignment": transform_increment_to_assignment,
+    "assignment_to_increment": transform_assignment_to_increment,
+    "decrement_to_assignment": transform_decrement_to_assignment,
+    "assignment_to_decrement": transform_assignment_to_decrement,
+
+    # Compound assignment transformations
+    "plus_equal_to_expanded": transform_plus_equal_to_expanded,
+    "expanded_to_plus_equal": transform_expanded_to_plus_equal,
+    "minus_equal_to_expanded": transform_minus_equal_to_expanded,
+    "expanded_to_minus_equal": transform_expanded_to_minus_equal,
+    "multiply_equal_to_expanded": transform_multiply_equal_to_expanded,
+    "expanded_to_multiply_equal": transform_expanded_to_multiply_equal,
+    "divide_equal_to_expanded": transform_divide_equal_to_expanded,
+    "expanded_to_divide_equal": transform_expanded_to_divide_equal,
+    "modulo_equal_to_expanded": transform_modulo_equal_to_expanded,
+    "expanded_to_modulo_equal": transform_expanded_to_modulo_equal,
+    "left_shift_equal_to_expanded": transform_left_shift_equal_to_expanded,
+    "expanded_to_left_shift_equal": transform_expanded_to_left_shift_equal,
+    "right_shift_equal_to_expanded": transform_right_shift_equal_to_expanded,
+    "expanded_to_right_shift_equal": transform_expanded_to_right_shift_equal,
+    "bitand_equal_to_expanded": transform_bitand_equal_to_expanded,
+    "expanded_to_bitand_equal": transform_expanded_to_bitand_equal,
+    "bitor_equal_to_expanded": transform_bitor_equal_to_expanded,
+    "expanded_to_bitor_equal": transform_expanded_to_bitor_equal,
+    "bitxor_equal_to_expanded": transform_bitxor_equal_to_expanded,
+    "expanded_to_bitxor_equal": transform_expanded_to_bitxor_equal,
+    # all compound operators at once
+    "compound_to_expanded_all": transform_compound_to_expanded_all,
+    "expanded_to_compound_all": transform_expanded_to_compound_all,
+
+    # Loop transformations
+    "while_to_for": transform_while_to_for,
+    "for_to_while": transform_for_to_while_with_cleanup,
+
+    # Clonegen transformations
+    "ch_rename": transform_names,
+    "ch_relation": transform_relational_expressions,
+    "ch_define": transform_variable_definitions,
+    "ch_constant": transform_number_literals,
+    "if_else_if": transform_if_elseif,
+}
 
-def apply_single_transformation(transformation_func, input_dir, output_base_dir, transformation_name):
+# Transformations that run when none are given with --transformations
+# Comment out transformations you don't want to run
+ENABLED_TRANSFORMATIONS = [
+    # "return_type_deduction",
+
+    # "increment_to_assignment",
+    # "assignment_to_increment",
+    # "decrement_to_assignment",
+    # "assignment_to_decrement",
+
+    # "plus_equal_to_expanded",
+    # "expanded_to_plus_equal",
+    # "minus_equal_to_expanded",
+    # "expanded_to_minus_equal",
+    # "multiply_equal_to_expanded",
+    # "expanded_to_multiply_equal",
+    # "divide_equal_to_expanded",
+    # "expanded_to_divide_equal",
+    # "modulo_equal_to_expanded",
+    # "expanded_to_modulo_equal",
+    # "left_shift_equal_to_expanded",
+    # "expanded_to_left_shift_equal",
+    # "right_shift_equal_to_expanded",
+    # "expanded_to_right_shift_equal",
+    # "bitand_equal_to_expanded",
+    # "expanded_to_bitand_equal",
+    # "bitor_equal_to_expanded",
+    # "expanded_to_bitor_equal",
+    # "bitxor_equal_to_expanded",
+    # "expanded_to_bitxor_equal",
+    # "compound_to_expanded_all",
+    # "expanded_to_compound_all",
+
+    # "while_to_for",
+    # "for_to_while",
+
+    # "ch_rename",
+    # "ch_relation",
+    # "ch_define",
+    # "ch_constant",
+    "if_else_if",
+]
+
+def transform_ast_copies(ast_bytes, transformation_names, source_name):
     """
-    Apply single transformation function and output results to specified directory
-    
+    Apply each transformation to its own copy of AST
+    (transformations modify the AST they're given)
+
     Args:
-        transformation_func: The transformation function to apply
-        input_dir: Directory containing input AST files
-        output_base_dir: Base directory where transformation folders will be created
-        transformation_name: Name of the transformation (used for directory name and logging)
+        ast_bytes: AST json as bytes (node table or nested dicts with text only stored at root)
+        transformation_names: Names of transformations to apply (keys of AST_TRANSFORMATIONS)
+        source_name: File name/record ID used in error messages
+
+    Yields:
+        (transformation name, modified AST) - failed transformations are left out
+    """
+    for transformation_name in transformation_names:
+        try:
+            ast = restore_ast(orjson.loads(ast_bytes))
+            yield transformation_name, AST_TRANSFORMATIONS[transformation_name](ast)
+        except Exception as e:
+            print(f"Error transforming {source_name} ({transformation_name}): {e}")
+            # log full error traceback (debugging)
+            print(traceback.format_exc())
+
+def transform_file(input_ast_path, output_base_dir, transformation_names, pretty=False):
     """
-    transformation_dir = os.path.join(output_base_dir, transformation_name)
-    os.makedirs(transformation_dir, exist_ok=True)
-    
-    print(f"Applying {transformation_name} transformation...")
-    transformation_func(input_dir, transformation_dir)
-    print(f"{transformation_name} transformation complete. Results in {transformation_dir}\n")
-    
-    return transformation_dir
-
-def apply_transformations(input_dir, output_base_dir):
+    Load single AST file once and save result of each transformation to its folder
+
+    Args:
+        input_ast_path: Path to input AST file
+        output_base_dir: Base directory containing one folder per transformation
+        transformation_names: Names of transformations to apply
+        pretty: Indent output json
     """
-    Apply all available transformations to ASTs in input directory
+    try:
+        with open(input_ast_path, 'rb') as f:
+            ast_bytes = f.read()
+    except OSError as e:
+        print(f"Error reading {input_ast_path}: {e}")
+        return
+
+    file_name = os.path.basename(input_ast_path)
+    for transformation_name, modified_ast in transform_ast_copies(ast_bytes, transformation_names, input_ast_path):
+        # save modified AST
+        save_ast(modified_ast, os.path.join(output_base_dir, transformation_name, file_name), pretty)
+
+def apply_transformations(input_dir, output_base_dir, transformation_names=None, pretty=False):
+    """
+    Apply transformations to ASTs in input directory
     (Each transformation creates its own output folder)
-    
+
     Args:
         input_dir: Directory containing input AST files
         output_base_dir: Base directory where transformation folders will be created
+        transformation_names: Names of transformations to apply (default: ENABLED_TRANSFORMATIONS)
+        pretty: Indent output json (compact by default)
     """
-    os.makedirs(output_base_dir, exist_ok=True)
-    
-    # Define all transformations as (function, name) tuples
-    # Comment out functions you don't want to run
-    transformations = [
-        # C++14 return type deduction transformation
-        # (apply_return_type_deduction, "return_type_deduction"),
-        
-        # Unary operator transformations
-        # (apply_increment_to_assignment_transformation, "increment_to_assignment"),
-        # (apply_assignment_to_increment_transformation, "assignment_to_increment"),
-        # (apply_decrement_to_assignment_transformation, "decrement_to_assignment"),
-        # (apply_assignment_to_decrement_transformation, "assignment_to_decrement"),
-        
-        # Compound assignment transformations
-        # (apply_plus_equal_to_expanded_transformation, "plus_equal_to_expanded"),
-        # (apply_expanded_to_plus_equal_transformation, "expanded_to_plus_equal"),
-        # (apply_minus_equal_to_expanded_transformation, "minus_equal_to_expanded"),
-        # (apply_expanded_to_minus_equal_transformation, "expanded_to_minus_equal"),
-        # (apply_multiply_equal_to_expanded_transformation, "multiply_equal_to_expanded"),
-        # (apply_expanded_to_multiply_equal_transformation, "expanded_to_multiply_equal"),
-        # (apply_divide_equal_to_expanded_transformation, "divide_equal_to_expanded"),
-        # (apply_expanded_to_divide_equal_transformation, "expanded_to_divide_equal"),
-        # (apply_modulo_equal_to_expanded_transformation, "modulo_equal_to_expanded"),
-        # (apply_expanded_to_modulo_equal_transformation, "expanded_to_modulo_equal"),
-        # (apply_left_shift_equal_to_expanded_transformation, "left_shift_equal_to_expanded"),
-        # (apply_expanded_to_left_shift_equal_transformation, "expanded_to_left_shift_equal"),
-        # (apply_right_shift_equal_to_expanded_transformation, "right_shift_equal_to_expanded"),
-        # (apply_expanded_to_right_shift_equal_transformation, "expanded_to_right_shift_equal"),
-        # (apply_bitand_equal_to_expanded_transformation, "bitand_equal_to_expanded"),
-        # (apply_expanded_to_bitand_equal_transformation, "expanded_to_bitand_equal"),
-        # (apply_bitor_equal_to_expanded_transformation, "bitor_equal_to_expanded"),
-        # (apply_expanded_to_bitor_equal_transformation, "expanded_to_bitor_equal"),
-        # (apply_bitxor_equal_to_expanded_transformation, "bitxor_equal_to_expanded"),
-        # (apply_expanded_to_bitxor_equal_transformation, "expanded_to_bitxor_equal"),
-
-        # Loop transformations
-        # (apply_while_to_for_transformation, "while_to_for"),
-        # (apply_for_to_while_transformation, "for_to_while")
-
-        # Clonegen transformations
-        # (apply_ch_rename_transformation, "ch_rename")
-        # (apply_relational_transformation, "ch_relation")
-        # (apply_ch_define_transformation, "ch_define")
-        # (apply_ch_constant_transformation, "ch_constant")
-        (apply_ch_if_elseIF_transformation, "if_else_if")
-    ]
-    
-    # Apply each transformation
-    for transformation_func, transformation_name in transformations:
-        apply_single_transformation(
-            transformation_func, 
-            input_dir, 
-            output_base_dir, 
-            transformation_name
-        )
+    if transformation_names is None:
+        transformation_names = ENABLED_TRANSFORMATIONS
+
+    for transformation_name in transformation_names:
+        os.makedirs(os.path.join(output_base_dir, transformation_name), exist_ok=True)
+
+    with os.scandir(input_dir) as entries:
+        file_paths = [entry.path for entry in entries if entry.is_file() and entry.name.endswith('.json')]
+
+    print(f"Applying transformations: {', '.join(transformation_names)}")
+
+    # each AST file is read once for all transformations; files are spread across all cores
+    worker = partial(transform_file, output_base_dir=output_base_dir, transformation_names=transformation_names,
+                     pretty=pretty)
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(worker, file_paths, chunksize=32))
+
+    for transformation_name in transformation_names:
+        print(f"{transformation_name} transformation complete. Results in {os.path.join(output_base_dir, transformation_name)}")
 
 def main():
     parser = argparse.ArgumentParser(description="Apply C++ modernization transformations to ASTs")
     parser.add_argument("--input", default="asts", help="Directory containing input AST files")
     parser.add_argument("--output", default="transformed_asts", help="Base directory for output ASTs")
-    
+    parser.add_argument("--transformations", nargs="+", choices=list(AST_TRANSFORMATIONS), metavar="NAME",
+                        help="Transformations to apply (default: ENABLED_TRANSFORMATIONS in transform_ast.py)")
+    parser.add_argument("--pretty", action="store_true", help="Indent output AST json (for reading by hand)")
+
     args = parser.parse_args()
-    
-    # Apply all transformations
-    apply_transformations(args.input, args.output)
-    
+
+    # Apply selected transformations
+    apply_transformations(args.input, args.output, args.transformations, args.pretty)
+
     print(f"All transformations completed. Results are in {args.output} directory.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
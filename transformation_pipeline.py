@@ -3,103 +3,294 @@
 # 1) takes jsonl file input
 # 2) applies transformations
 # 3) outputs transformed jsonl
+# Records stay in memory between steps - the intermediate .cpp/.json files
+# are only written when --debug-dump is set
+# Results of previous run are reused for records that haven't changed (see .cache.json in output directory)
 
 import os
 import argparse
-import sys
+import hashlib
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import orjson
+
+# xxhash is optional - much faster than hashlib for the change detection below
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 # Import functions from individual pipeline steps
-from jsonl_to_cpp import process_jsonl_file
-from extract_ast import extract_ast_from_directory
-from transform_ast import apply_transformations
-from reconstruct_source import process_all_asts
-from cpp_to_jsonl import process_cpp_directory
+from extract_ast import parse_to_ast
+from transform_ast import AST_TRANSFORMATIONS, ENABLED_TRANSFORMATIONS, transform_ast_copies
+from transformations.ast_io import save_ast
+from cpp_to_jsonl import WRITE_BATCH_SIZE
+
+def stream_records(input_jsonl):
+    """
+    Yield (id, record) for each record in input jsonl with ID in desired range
+    (same records jsonl_to_cpp.py writes out as .cpp files)
+
+    Args:
+        input_jsonl: Path to input jsonl file
+    """
+    try:
+        with open(input_jsonl, 'rb') as f:
+            for line in f:
+                try:
+                    data = orjson.loads(line)  # parse JSON line
+
+                    # check if ID in desired range
+                    if 0 <= data['id'] <= 6763 and 'input' in data:
+                        yield data['id'], data
+
+                except orjson.JSONDecodeError as e:
+                    print(f"Error parsing JSON line: {e}")
+                except KeyError as e:
+                    print(f"Missing required key in JSON: {e}")
+                except Exception as e:
+                    print(f"Error processing line: {e}")
+
+    except FileNotFoundError:
+        print(f"Input file not found: {input_jsonl}")
+
+# number of records sent to a worker at once
+RECORD_BATCH_SIZE = 128
+
+# index of previous run: input hash of each record per transformation
+CACHE_FILE_NAME = ".cache.json"
+
+def get_code_stamp():
+    """
+    Newest modification time of parsing/transformation source files
+    (cached results are only reused if none of them changed since)
+    """
+    root = Path(__file__).resolve().parent
+    paths = [root / "extract_ast.py", root / "transform_ast.py", root / "transformation_pipeline.py"]
+    paths.extend((root / "transformations").rglob("*.py"))
+    return max(path.stat().st_mtime for path in paths)
+
+# name of hash used by hash_code (stored in cache - hashes from another algorithm are never reused)
+HASH_NAME = "xxh3_64" if xxhash is not None else "blake2b"
+
+def hash_code(code):
+    code_bytes = code.encode('utf-8')
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(code_bytes)
+    return hashlib.blake2b(code_bytes, digest_size=16).hexdigest()
+
+def load_cache(base_dir, code_stamp):
+    """
+    Load input hashes of previous run
+
+    Returns:
+        {transformation name: {record id: input hash}} - empty if there's no cache or code changed since
+    """
+    try:
+        cache = orjson.loads((base_dir / CACHE_FILE_NAME).read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+    if cache.get("code_stamp") != code_stamp or cache.get("hash") != HASH_NAME:
+        return {}
+
+    return {
+        transformation_name: {int(record_id): input_hash for record_id, input_hash in input_hashes.items()}
+        for transformation_name, input_hashes in cache.get("transformations", {}).items()
+    }
+
+def save_cache(base_dir, code_stamp, cache):
+    with open(base_dir / CACHE_FILE_NAME, 'wb') as f:
+        f.write(orjson.dumps({"code_stamp": code_stamp, "hash": HASH_NAME, "transformations": cache},
+                             option=orjson.OPT_NON_STR_KEYS))
+
+def load_previous_output(output_jsonl):
+    """
+    Load transformed code by ID from output jsonl of previous run (empty if missing/unreadable)
+    """
+    previous = {}
+    try:
+        with open(output_jsonl, 'rb') as f:
+            for line in f:
+                data = orjson.loads(line)
+                previous[data['id']] = data['input']
+    except (OSError, orjson.JSONDecodeError, KeyError):
+        return {}
+
+    return previous
+
+def write_debug_file(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def process_record(record_id, code, transformation_names, debug_dir=None):
+    """
+    Parse single record, apply each transformation and reconstruct transformed code (all in memory)
+
+    Args:
+        record_id: ID of the record
+        code: C++ source code of the record
+        transformation_names: Names of transformations to apply (keys of AST_TRANSFORMATIONS)
+        debug_dir: If set, intermediate files are dumped here (same layout as the file based steps)
+
+    Returns:
+        (record_id, {transformation name: transformed code}) - failed transformations are left out
+    """
+    file_name = f"code_{record_id:04d}"
+
+    # preserve the \n character (same as jsonl_to_cpp.py)
+    # code is on a single line - real newlines only come from \n escapes inside string literals,
+    # so they're turned back into escapes for tree-sitter and only undone for records that had any
+    escaped = '\n' in code
+    if escaped:
+        code = code.replace('\n', '\\n')
+
+    try:
+        ast_json = parse_to_ast(code)
+    except Exception as e:
+        print(f"Error processing record {record_id}: {e}")
+        return record_id, {}
+
+    if debug_dir:
+        write_debug_file(os.path.join(debug_dir, "extracted_code", f"{file_name}.cpp"), code)
+        save_ast(ast_json, os.path.join(debug_dir, "asts", f"{file_name}.json"), pretty=True)
+
+    results = {}
+    ast_bytes = orjson.dumps(ast_json)
+    for transformation_name, modified_ast in transform_ast_copies(ast_bytes, transformation_names, f"record {record_id}"):
+        # text from root node = whole transformed code
+        source_code = modified_ast.get("text", "")
+
+        if debug_dir:
+            save_ast(modified_ast, os.path.join(debug_dir, "transformed_asts", transformation_name, f"{file_name}.json"),
+                     pretty=True)
+            write_debug_file(os.path.join(debug_dir, f"{transformation_name}_code", f"{file_name}.cpp"), source_code)
+
+        # because we did \n -> \\n above (same as cpp_to_jsonl.py)
+        if escaped:
+            source_code = source_code.replace('\\n', '\n')
+        results[transformation_name] = source_code
 
-def run_pipeline(input_jsonl, output_dir="pipeline_output"):
+    return record_id, results
+
+def process_batch(batch, debug_dir=None):
+    """
+    Process batch of records in one worker task (less pickling/IPC than one task per record)
+
+    Args:
+        batch: List of (record_id, code, transformation_names)
+        debug_dir: If set, intermediate files are dumped here
+
+    Returns:
+        List of process_record results
+    """
+    return [process_record(record_id, code, names, debug_dir) for record_id, code, names in batch]
+
+def write_transformed_jsonl(output_jsonl, records, transformed_code):
+    """
+    Write transformed code to jsonl file, keeping all other fields of the original records
+
+    Args:
+        output_jsonl: Path to output jsonl file
+        records: Original records by ID
+        transformed_code: Transformed code by ID
+    """
+    # large buffer + batched writes instead of one write per line
+    chunks = []
+    with open(output_jsonl, 'wb', buffering=1 << 20) as out_f:
+        for record_id in sorted(transformed_code):
+            # Create new data object with updated input
+            new_data = records[record_id].copy()
+            new_data["input"] = transformed_code[record_id]
+
+            chunks.append(orjson.dumps(new_data, option=orjson.OPT_APPEND_NEWLINE))
+            if len(chunks) >= WRITE_BATCH_SIZE:
+                out_f.writelines(chunks)
+                chunks.clear()
+
+        out_f.writelines(chunks)
+
+    print(f"JSONL file created: {output_jsonl}")
+
+def run_pipeline(input_jsonl, output_dir="pipeline_output", debug_dump=False, transformation_names=None,
+                 use_cache=True):
     start_time = time.time()
-    
-    # Create output directory structure
+
+    # transformations enabled in transform_ast.py unless given explicitly
+    if transformation_names is None:
+        transformation_names = ENABLED_TRANSFORMATIONS
+
     base_dir = Path(output_dir)
-    extracted_code_dir = base_dir / "extracted_code"
-    asts_dir = base_dir / "asts"
-    transformed_asts_dir = base_dir / "transformed_asts"
     base_dir.mkdir(exist_ok=True)
-    
+
     print(f"\nStarting transformation pipeline on {input_jsonl}")
     print(f"All outputs will be saved to {base_dir.absolute()}")
-    
-    # Step 1: Extract code from jsonl to .cpp files
-    print("\n--- Step 1: Extracting code from JSONL ---")
-    process_jsonl_file(input_jsonl, str(extracted_code_dir))
-    
-    # Step 2: Generate ASTs from .cpp files
-    print("\n--- Step 2: Generating ASTs ---")
-    extract_ast_from_directory(str(extracted_code_dir))
-    
-    # Move ASTs to pipeline directory (they're created in 'asts' by default)
-    if os.path.exists('asts'):
-        # Create destination directory
-        asts_dir.mkdir(exist_ok=True)
-        
-        # Move all files
-        for file in os.listdir('asts'):
-            src = os.path.join('asts', file)
-            dst = os.path.join(str(asts_dir), file)
-            
-            # Copy instead of move (avoid permission issues)
-            with open(src, 'r', encoding='utf-8') as src_file:
-                content = src_file.read()
-                with open(dst, 'w', encoding='utf-8') as dst_file:
-                    dst_file.write(content)
-            
-            # Remove original
-            try:
-                os.remove(src)
-            except:
-                print(f"Could not remove {src}, continuing...")
-        
-        # Remove original directory
-        try:
-            os.rmdir('asts')
-        except:
-            print("Could not remove 'asts' directory, continuing...")
-    
-    # Step 3: Apply transformations to ASTs
-    print(f"\n--- Step 3: Applying transformations ---")
-    transformed_asts_base_dir = transformed_asts_dir
-    transformed_asts_base_dir.mkdir(exist_ok=True)
-    apply_transformations(str(asts_dir), str(transformed_asts_base_dir))
-    
-    # Step 4: Reconstruct source code from transformed ASTs
-    print("\n--- Step 4: Reconstructing source code ---")
-    
-    # Process each transformation folder
+
+    # Step 1: Read records from jsonl (later duplicate IDs replace earlier ones)
+    print("\n--- Step 1: Reading records from JSONL ---")
+    records = dict(stream_records(input_jsonl))
+
+    debug_dir = None
+    if debug_dump:
+        debug_dir = str(base_dir)
+        os.makedirs(base_dir / "extracted_code", exist_ok=True)
+        os.makedirs(base_dir / "asts", exist_ok=True)
+        for transformation_name in transformation_names:
+            os.makedirs(base_dir / "transformed_asts" / transformation_name, exist_ok=True)
+            os.makedirs(base_dir / f"{transformation_name}_code", exist_ok=True)
+
+    # Step 2: Reuse results of previous run for records whose input (and the code) hasn't changed
+    # (debug dumps need every record to go through all steps -> no cache)
+    code_stamp = get_code_stamp()
+    cache = load_cache(base_dir, code_stamp) if use_cache and not debug_dump else {}
+    input_hashes = {record_id: hash_code(data['input']) for record_id, data in records.items()}
+
+    transformed = {transformation_name: {} for transformation_name in transformation_names}
+    pending = {record_id: [] for record_id in sorted(records)}  # transformations still to apply per record
+    for transformation_name in transformation_names:
+        cached_hashes = cache.get(transformation_name, {})
+        previous = load_previous_output(base_dir / f"{transformation_name}.jsonl") if cached_hashes else {}
+
+        for record_id in pending:
+            if record_id in previous and cached_hashes.get(record_id) == input_hashes[record_id]:
+                transformed[transformation_name][record_id] = previous[record_id]
+            else:
+                pending[record_id].append(transformation_name)
+
+        if previous:
+            print(f"{transformation_name}: reusing {len(transformed[transformation_name])} records from previous run")
+
+    # Step 3: Parse, transform and reconstruct each record
+    # records are independent -> spread them across all cores
+    print(f"\n--- Step 3: Applying transformations: {', '.join(transformation_names)} ---")
+    tasks = [(record_id, records[record_id]['input'], names) for record_id, names in pending.items() if names]
+    batches = [tasks[i:i + RECORD_BATCH_SIZE] for i in range(0, len(tasks), RECORD_BATCH_SIZE)]
+    worker = partial(process_batch, debug_dir=debug_dir)
+
+    with ProcessPoolExecutor() as executor:
+        for batch_results in executor.map(worker, batches):
+            for record_id, results in batch_results:
+                for transformation_name, source_code in results.items():
+                    transformed[transformation_name][record_id] = source_code
+
+    # Step 4: Write one jsonl per transformation
+    print("\n--- Step 4: Writing transformed JSONL ---")
     output_jsonls = []
-    for transform_dir in os.listdir(str(transformed_asts_dir)):
-        # skip non-directories
-        transform_path = transformed_asts_dir / transform_dir
-        if not os.path.isdir(transform_path):
-            continue
-            
-        print(f"Processing transformation: {transform_dir}")
-        
-        # Create output directory for this transformation
-        modernized_code_dir = base_dir / f"{transform_dir}_code"
-        modernized_code_dir.mkdir(exist_ok=True)
-        
-        # Process ASTs for this transformation
-        process_all_asts(str(transform_path), str(modernized_code_dir))
-        
-        # Step 5: Convert modernized code back to jsonl
-        output_jsonl = base_dir / f"{transform_dir}.jsonl"
-        process_cpp_directory(str(modernized_code_dir), str(output_jsonl), input_jsonl)
+    for transformation_name in transformation_names:
+        output_jsonl = base_dir / f"{transformation_name}.jsonl"
+        write_transformed_jsonl(str(output_jsonl), records, transformed[transformation_name])
         output_jsonls.append(output_jsonl)
-    
+
+        cache[transformation_name] = input_hashes
+
+    save_cache(base_dir, code_stamp, cache)
+
     elapsed_time = time.time() - start_time
     print(f"\nPipeline completed in {elapsed_time:.2f} seconds!")
-    
+
     if output_jsonls:
         print("Transformed JSONL files saved to:")
         for jsonl in output_jsonls:
@@ -110,16 +301,22 @@ def run_pipeline(input_jsonl, output_dir="pipeline_output"):
 def main():
     parser = argparse.ArgumentParser(description="Run the complete C++ modernization pipeline")
     parser.add_argument("--output-dir", default="pipeline_output", help="Directory to store all outputs")
-    
+    parser.add_argument("--debug-dump", action="store_true",
+                        help="Also write intermediate .cpp and AST files to the output directory")
+    parser.add_argument("--transformations", nargs="+", choices=list(AST_TRANSFORMATIONS), metavar="NAME",
+                        help="Transformations to apply (default: ENABLED_TRANSFORMATIONS in transform_ast.py)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Process all records again instead of reusing unchanged results of previous run")
+
     args = parser.parse_args()
-    
+
     input_jsonl = input("Enter the name of the JSONL file to process: ")
-    
+
     if not os.path.exists(input_jsonl):
         print(f"Error: File '{input_jsonl}' not found.")
         return
-    
-    run_pipeline(input_jsonl, args.output_dir)
+
+    run_pipeline(input_jsonl, args.output_dir, args.debug_dump, args.transformations, not args.no_cache)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,226 @@
+# Sofia Deichert - Code Transformation Project
+# Helpers for loading/saving AST json files (created by extract_ast.py)
+# AST files only store text on the root node - text of every other node is a slice of it
+# Files from extract_ast.py hold a flat node table, transformed ASTs are nested dicts - load_ast reads both
+
+import os
+import sys
+from pathlib import Path
+
+import orjson
+
+def add_node_text(ast_json):
+    """
+    Fill in text field of every node below root using root text
+    (transformations read node["text"] on all nodes)
+
+    Args:
+        ast_json: AST dict with text only stored at root
+
+    Returns:
+        same AST dict with text set on every node
+    """
+    # byte positions index into utf-8 encoded source (not into python string)
+    source = ast_json["text"].encode("utf-8")
+    base = ast_json["start_byte"]
+
+    ast_json["type"] = sys.intern(ast_json["type"])
+
+    stack = list(ast_json.get("children", []))
+    while stack:
+        node = stack.pop()
+        node["type"] = sys.intern(node["type"])
+        node["text"] = source[node["start_byte"] - base:node["end_byte"] - base].decode("utf-8")
+        stack.extend(node.get("children", []))
+
+    return ast_json
+
+def table_to_ast(ast_table):
+    """
+    Build nested AST dict (with text on every node) from flat node table
+
+    Args:
+        ast_table: dict with root text and types/starts/ends/parents lists (nodes in pre-order)
+
+    Returns:
+        AST dict
+    """
+    text = ast_table["text"]
+    starts, ends, parents = ast_table["starts"], ast_table["ends"], ast_table["parents"]
+
+    # only a few hundred distinct node types -> share one string per type
+    # (type checks against literals in transformations can then compare by identity)
+    types = [sys.intern(node_type) for node_type in ast_table["types"]]
+
+    # byte positions index into utf-8 encoded source (not into python string)
+    source = text.encode("utf-8")
+    base = starts[0]
+
+    root = {"text": text, "type": types[0], "start_byte": base, "end_byte": ends[0], "children": []}
+
+    # children list of each node by index - parents always come before their children
+    children = [root["children"]]
+    for node_type, start, end, parent_index in zip(types[1:], starts[1:], ends[1:], parents[1:]):
+        node_children = []
+        children[parent_index].append({
+            "type": node_type,
+            "start_byte": start,
+            "end_byte": end,
+            "children": node_children,
+            "text": source[start - base:end - base].decode("utf-8")
+        })
+        children.append(node_children)
+
+    return root
+
+def restore_ast(ast_json):
+    """
+    Turn loaded AST json (node table or nested dicts) into nested AST dict with text on every node
+    """
+    if "types" in ast_json:
+        return table_to_ast(ast_json)
+    return add_node_text(ast_json)
+
+def has_node_type(ast_json, node_type):
+    """
+    Check if loaded AST json (node table or nested dicts) has any node of given type
+    Works before restore_ast -> transformations can skip files they wouldn't change without building the AST
+    """
+    if "types" in ast_json:
+        return node_type in ast_json["types"]
+    
+    stack = [ast_json]
+    while stack:
+        node = stack.pop()
+        if node["type"] == node_type:
+            return True
+        stack.extend(node.get("children", ()))
+    
+    return False
+
+def load_ast(ast_file_path):
+    """
+    Load AST json file and restore text on all nodes
+
+    Args:
+        ast_file_path: Path to AST json file
+
+    Returns:
+        AST dict
+    """
+    ast_json = orjson.loads(Path(ast_file_path).read_bytes())
+
+    return restore_ast(ast_json)
+
+def has_stale_nodes(ast_json):
+    """
+    Check if nodes below root no longer match root text
+    (transformations change root text, but leave positions/text of other nodes as they were)
+    Leaves cover all non-whitespace source -> only their text is compared
+    """
+    source = ast_json["text"].encode("utf-8")
+    base = ast_json["start_byte"]
+    if ast_json["end_byte"] - base != len(source):
+        return True
+
+    stack = list(ast_json.get("children", ()))
+    while stack:
+        node = stack.pop()
+        children = node.get("children")
+        if children:
+            stack.extend(children)
+        elif "text" in node and source[node["start_byte"] - base:node["end_byte"] - base] != node["text"].encode("utf-8"):
+            return True
+
+    return False
+
+def strip_node_text(ast_json):
+    """
+    Copy of nested AST dict with text only stored at root (format written by save_ast)
+    Nodes that no longer match root text are left out - only root text is kept then
+
+    Args:
+        ast_json: AST dict (text on every node)
+
+    Returns:
+        AST dict with text only at root
+    """
+    text = ast_json.get("text", "")
+    root = {"text": text, "type": ast_json["type"], "start_byte": ast_json["start_byte"], "end_byte": ast_json["end_byte"],
+            "children": []}
+
+    if has_stale_nodes(ast_json):
+        root["end_byte"] = root["start_byte"] + len(text.encode("utf-8"))
+        return root
+
+    stack = [(child, root["children"]) for child in reversed(ast_json.get("children", ()))]
+    while stack:
+        node, siblings = stack.pop()
+        node_children = []
+        siblings.append({"type": node["type"], "start_byte": node["start_byte"], "end_byte": node["end_byte"],
+                         "children": node_children})
+        stack.extend((child, node_children) for child in reversed(node.get("children", ())))
+
+    return root
+
+def nested_to_table(ast_json):
+    """
+    Flat node table (format of extracted AST files) of nested AST dict
+    Nodes that no longer match root text are left out - only root text is kept then
+    """
+    text = ast_json.get("text", "")
+    base = ast_json["start_byte"]
+
+    if has_stale_nodes(ast_json):
+        return {"text": text, "types": [ast_json["type"]], "starts": [base],
+                "ends": [base + len(text.encode("utf-8"))], "parents": [-1]}
+
+    types, starts, ends, parents = [], [], [], []
+
+    # pre-order, children in source order (same as extract_ast.ast_to_table)
+    stack = [(ast_json, -1)]
+    while stack:
+        node, parent_index = stack.pop()
+        index = len(types)
+        types.append(node["type"])
+        starts.append(node["start_byte"])
+        ends.append(node["end_byte"])
+        parents.append(parent_index)
+        stack.extend((child, index) for child in reversed(node.get("children", ())))
+
+    return {"text": text, "types": types, "starts": starts, "ends": ends, "parents": parents}
+
+def save_ast(ast_json, ast_file_path, pretty=False):
+    """
+    Save AST to json file (compact unless pretty is set)
+    Text is only written for root - nested AST dicts are saved as node table
+    (or as nested dicts without node text when pretty is set)
+
+    Args:
+        ast_json: AST dict (node table or nested dicts)
+        ast_file_path: Path to output AST json file
+        pretty: Indent json for reading by hand
+    """
+    if "types" not in ast_json:
+        ast_json = strip_node_text(ast_json) if pretty else nested_to_table(ast_json)
+
+    # whole file encoded up front and written in one call
+    Path(ast_file_path).write_bytes(orjson.dumps(ast_json, option=orjson.OPT_INDENT_2 if pretty else 0))
+
+def save_source(ast_json, ast_file_path):
+    """
+    Save only root text of AST as C++ source (same .cpp file reconstruct_source.py would write for it)
+    Skips serializing the whole AST when only transformed code is needed
+
+    Args:
+        ast_json: AST dict
+        ast_file_path: Path the AST json would have been saved to (.json is replaced by .cpp)
+
+    Returns:
+        Path of written source file
+    """
+    source_file_path = os.path.splitext(ast_file_path)[0] + '.cpp'
+    with open(source_file_path, 'w', encoding='utf-8') as f:
+        f.write(ast_json.get("text", ""))
+
+    return source_file_path
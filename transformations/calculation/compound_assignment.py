@@ -12,10 +12,12 @@
 # (11) i |= j ↔ i = i | j
 # (12) i ^= j ↔ i = i ^ j
 
-import json
-import copy
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from transformations.ast_io import load_ast, restore_ast, save_ast
 
 COMPOUND_TO_BINARY = {
     "+=": "+",
@@ -35,6 +37,34 @@ BINARY_TO_COMPOUND = {v: k for k, v in COMPOUND_TO_BINARY.items()}
 
 # reference - all compound operators 
 ALL_COMPOUND_OPS = list(COMPOUND_TO_BINARY.keys())
+COMPOUND_OPS_SET = frozenset(ALL_COMPOUND_OPS)
+
+# node types that count as statements when looking for parent statement of a node
+STATEMENT_TYPES = frozenset([
+    "expression_statement", 
+    "if_statement", 
+    "for_statement", 
+    "while_statement",
+    "do_statement",
+    "compound_statement",
+    "declaration"
+])
+
+# other left side expressions get_variable_expression accepts as-is (besides identifiers/subscripts)
+MEMBER_EXPRESSION_TYPES = frozenset(["field_expression", "pointer_expression"])
+
+# right operand types that need parentheses when expanded (i *= a + b -> i = i * (a + b))
+PARENTHESIZED_OPERAND_TYPES = frozenset([
+    "binary_expression", 
+    "conditional_expression", 
+    "logical_expression"
+])
+
+# statement terminators skipped by contains_multiple_compound_assignments
+TERMINATOR_TYPES = frozenset([";", "}"])
+
+# operator characters of tokens counted by is_non_transformable_expression
+OPERATOR_CHAR_PATTERN = re.compile(r'[+\-*/%&|^<>]')
 
 def get_variable_expression(node):
     """
@@ -51,7 +81,7 @@ def get_variable_expression(node):
             return None
         return node["text"]
     # Other more complex expressions that could be on left side of an assignment
-    elif node["type"] in ["field_expression", "pointer_expression"]:
+    elif node["type"] in MEMBER_EXPRESSION_TYPES:
         # E.g. obj.field, ptr->field
         return node["text"]
     return None
@@ -74,7 +104,7 @@ def contains_multiple_compound_assignments(node):
     if node["type"] == "expression_statement":
         # Get expression within the statement
         for child in node.get("children", []):
-            if child["type"] not in [";", "}"]:  # skip terminators
+            if child["type"] not in TERMINATOR_TYPES:  # skip terminators
                 count = count_compound_assignments(child)
                 break
     else:
@@ -95,15 +125,19 @@ def count_compound_assignments(node):
     """
     count = 0
     
-    # Check if this node is compound assignment
-    if node["type"] == "assignment_expression" and len(node["children"]) > 1:
-        op_node = node["children"][1]
-        if op_node["type"] in ALL_COMPOUND_OPS:
-            count += 1
-    
-    # Recursively check children
-    for child in node.get("children", []):
-        count += count_compound_assignments(child)
+    # explicit stack instead of recursion (deep ASTs can hit the recursion limit)
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        children = current.get("children")
+        
+        # Check if this node is compound assignment
+        if current["type"] == "assignment_expression" and children and len(children) > 1:
+            if children[1]["type"] in COMPOUND_OPS_SET:
+                count += 1
+        
+        if children:
+            stack.extend(children)
     
     return count
 
@@ -114,36 +148,72 @@ def find_parent_statement(ast_node, target_node, parent=None):
     Args:
         ast_node: root AST node to search from
         target_node: node to find the parent statement for
-        parent: current parent node (used for recursion)
+        parent: parent statement of ast_node (None at root)
         
     Returns:
         parent statement node, or None if not found
     """
-    # Check if this is target node
-    if ast_node == target_node:
-        return parent
-    
-    # Check if this is statement node (potential parent)
-    is_statement = ast_node["type"] in [
-        "expression_statement", 
-        "if_statement", 
-        "for_statement", 
-        "while_statement",
-        "do_statement",
-        "compound_statement",
-        "declaration"
-    ]
-    
-    current_parent = ast_node if is_statement else parent
-    
-    # Recursively search children
-    for child in ast_node.get("children", []):
-        found = find_parent_statement(child, target_node, current_parent)
-        if found:
-            return found
+    # explicit stack instead of recursion, children pushed in reverse -> searched in source order
+    stack = [(ast_node, parent)]
+    while stack:
+        node, node_parent = stack.pop()
+        
+        # Check if this is target node (identity - comparing dicts with == walks whole subtrees)
+        if node is target_node:
+            if node_parent:
+                return node_parent
+            continue
+        
+        # Check if this is statement node (potential parent)
+        is_statement = node["type"] in STATEMENT_TYPES
+        
+        current_parent = node if is_statement else node_parent
+        
+        for child in reversed(node.get("children", [])):
+            stack.append((child, current_parent))
     
     return None
 
+def build_statement_index(ast_node):
+    """
+    Find parent statement and compound assignment count of every node in one traversal
+    (instead of searching from root for each candidate node)
+    
+    Args:
+        ast_node: root AST node
+        
+    Returns:
+        (parent_statements, compound_counts)
+        parent_statements: id(node) -> closest enclosing statement node (None if there is none)
+        compound_counts: id(node) -> num of compound assignments in node and its descendants
+    """
+    parent_statements = {}
+    nodes = []  # (node, parent node) in pre-order
+    
+    stack = [(ast_node, None, None)]
+    while stack:
+        node, parent, parent_statement = stack.pop()
+        parent_statements[id(node)] = parent_statement
+        nodes.append((node, parent))
+        
+        current_statement = node if node["type"] in STATEMENT_TYPES else parent_statement
+        for child in node.get("children", []):
+            stack.append((child, node, current_statement))
+    
+    # Add up counts bottom-up (reversed pre-order -> children come before their parent)
+    compound_counts = {}
+    for node, parent in reversed(nodes):
+        count = compound_counts.get(id(node), 0)
+        if node["type"] == "assignment_expression" and len(node["children"]) > 1:
+            if node["children"][1]["type"] in COMPOUND_OPS_SET:
+                count += 1
+        compound_counts[id(node)] = count
+        
+        if parent is not None:
+            compound_counts[id(parent)] = compound_counts.get(id(parent), 0) + count
+    
+    return parent_statements, compound_counts
+
 def is_compound_assignment(node, operator):
     """
     Check if node is a compound assignment expression with specified operator (+=, -=, etc.)
@@ -222,6 +292,43 @@ def is_expanded_assignment(node, operator):
     
     return False
 
+def is_any_compound_assignment(node, operators):
+    """
+    Check if node is a compound assignment expression with any of given operators
+    (operators are mutually exclusive, so one traversal finds matches for all of them)
+    
+    Args:
+        node: AST node to check
+        operators: set of compound assignment operators (e.g., {"+=", "-="})
+        
+    Returns:
+        bool: True if node is a compound assignment with one of the operators
+    """
+    if node["type"] == "assignment_expression" and len(node["children"]) == 3:
+        operator = node["children"][1]["type"]
+        return operator in operators and is_compound_assignment(node, operator)
+    
+    return False
+
+def is_any_expanded_assignment(node, operators):
+    """
+    Check if node is an expanded assignment (i = i + j) with any of given binary operators
+    
+    Args:
+        node: AST node to check
+        operators: set of binary operators (e.g., {"+", "-"})
+        
+    Returns:
+        bool: True if node matches the i = i OP j pattern w/ one of the operators
+    """
+    if node["type"] == "assignment_expression" and len(node["children"]) == 3:
+        right_node = node["children"][2]
+        if right_node["type"] == "binary_expression" and len(right_node["children"]) == 3:
+            operator = right_node["children"][1]["type"]
+            return operator in operators and is_expanded_assignment(node, operator)
+    
+    return False
+
 def is_non_transformable_expression(node):
     """
     Check if a binary expression is non-transformable to compound assignment.
@@ -238,8 +345,6 @@ def is_non_transformable_expression(node):
     """
     # We're looking at a binary expression on the right side of "="
     if node["type"] == "binary_expression":
-        text = node["text"] # Get text of complete expression
-        
         # Get variable name (left side of assignment)
         # It's first grandchild of assignment expression
         left_node = node["children"][0]
@@ -248,32 +353,30 @@ def is_non_transformable_expression(node):
             return False
         
         # Check if there are multiple operations involving variable
-        # For example: i = i % 3 + 5 or i = i % 3 * 2
-        operator = node["children"][1]["text"]
-        right_text = node["children"][2]["text"]
-        
-        # Remove any parentheses for pattern analysis
-        pattern_text = text.replace('(', '').replace(')', '')
-        
-        # Check for patterns like "i op1 expr1 op2 expr2" where op1 != op2
-        # This would indicate a complex expression that can't be safely transformed to a compound assignment
-        
-        # Count occurrences of var in the expression
-        var_count = pattern_text.count(var_name)
-        
-        # If the var appears more than once, it might be a complex expression
-        if var_count > 1:
-            # Check if there are additional operations after binary operation
-            pattern = re.compile(r'[+\-*/%&|^<>]')
-            ops = pattern.findall(pattern_text)
+        # For example: i = i + i * 2
+        # -> walk right operand (AST instead of text, so e.g. "i" inside "min" or inside a string doesn't count)
+        uses_var = False
+        has_operator = False
+        stack = [node["children"][2]]
+        while stack:
+            current = stack.pop()
+            children = current.get("children")
             
-            # If there's more than one operator, it's likely a non-transformable expression
-            if len(ops) > 1:
+            if current["type"] == left_node["type"] and current["text"] == var_name:
+                # variable used again on right side
+                uses_var = True
+            elif children:
+                stack.extend(children)
+            elif OPERATOR_CHAR_PATTERN.search(current["type"]):
+                # operator token (+, -, <<, ->, ...) -> another operation besides the outer one
+                has_operator = True
+            
+            if uses_var and has_operator:
                 return True
     
     return False
 
-def should_skip_node(node, ast_node):
+def should_skip_node(node, ast_node, statement_index=None):
     """
     Check if a node should be skipped for transformation.
     Skips nodes that are part of statements with multiple compound assignments.
@@ -281,10 +384,16 @@ def should_skip_node(node, ast_node):
     Args:
         node: The node to check
         ast_node: The root node to search from
+        statement_index: Result of build_statement_index(ast_node) (optional - avoids searching from root)
         
     Returns:
         bool: True if the node should be skipped, False otherwise
     """
+    if statement_index is not None:
+        parent_statements, compound_counts = statement_index
+        parent_statement = parent_statements.get(id(node))
+        return parent_statement is not None and compound_counts[id(parent_statement)] > 1
+    
     # Find the parent statement of this node
     parent_statement = find_parent_statement(ast_node, node)
     
@@ -294,7 +403,7 @@ def should_skip_node(node, ast_node):
     
     return False
 
-def find_nodes(ast_node, pattern_func, operator, results=None, parent_root=None):
+def find_nodes(ast_node, pattern_func, operator, results=None, parent_root=None, statement_index=None):
     """
     find nodes matching a specific pattern
     
@@ -304,6 +413,7 @@ def find_nodes(ast_node, pattern_func, operator, results=None, parent_root=None)
         operator: Operator to look for
         results: List to collect results (internal use)
         parent_root: The root AST node for context checks (internal use)
+        statement_index: Parent statements/counts of parent_root, built once (internal use)
         
     Returns:
         List of nodes matching pattern
@@ -314,15 +424,72 @@ def find_nodes(ast_node, pattern_func, operator, results=None, parent_root=None)
     if parent_root is None:
         parent_root = ast_node
     
-    # Check if this node matches pattern
-    if pattern_func(ast_node, operator):
-        # Check if node should be skipped
-        if not should_skip_node(ast_node, parent_root):
-            results.append(ast_node)
+    if statement_index is None:
+        statement_index = build_statement_index(parent_root)
+    
+    # explicit stack instead of recursion, children pushed in reverse -> results stay in source order
+    stack = [ast_node]
+    while stack:
+        node = stack.pop()
+        
+        # Check if this node matches pattern
+        if pattern_func(node, operator):
+            # Check if node should be skipped
+            if not should_skip_node(node, parent_root, statement_index):
+                results.append(node)
+        
+        stack.extend(reversed(node.get("children", [])))
+    
+    return results
+
+def find_nodes_in_operator_order(ast_node, pattern_func, operators, get_operator, count_change):
+    """
+    find nodes matching pattern for several operators at once, with the same result as
+    calling find_nodes (and rewriting the matches) for one operator after another
+    Statements with multiple compound assignments are skipped, so rewriting matches of one
+    operator changes which matches of later operators are skipped
+    Matches of different operators can be nested (i = i + (j = j - 1)) - replace_nodes
+    rewrites the inner one inside the outer one's replacement then
     
-    # Recursively search children
-    for child in ast_node.get("children", []):
-        find_nodes(child, pattern_func, operator, results, parent_root)
+    Args:
+        ast_node: root AST node
+        pattern_func: Function that checks if a node matches the pattern for any of the operators
+        operators: Operators to look for (in order they would be applied in)
+        get_operator: Function returning operator of a matching node
+        count_change: Change of compound assignment count when a match is rewritten (-1 or +1)
+        
+    Returns:
+        List of nodes to rewrite
+    """
+    statement_index = build_statement_index(ast_node)
+    parent_statements, compound_counts = statement_index
+    
+    # single traversal collects matches of every operator (in source order)
+    matches = {operator: [] for operator in operators}
+    operator_set = frozenset(operators)
+    stack = [ast_node]
+    while stack:
+        node = stack.pop()
+        if pattern_func(node, operator_set):
+            matches[get_operator(node)].append(node)
+        stack.extend(reversed(node.get("children", [])))
+    
+    results = []
+    for operator in operators:
+        # matches of one operator are checked against counts before any of them is rewritten
+        # (match inside another one of the same operator is replaced along with it - not rewritten itself)
+        accepted = drop_nested_nodes(
+            [node for node in matches[operator] if not should_skip_node(node, ast_node, statement_index)]
+        )
+        
+        # rewritten matches change compound assignment count of every enclosing statement
+        for node in accepted:
+            statement = parent_statements.get(id(node))
+            while statement is not None:
+                compound_counts[id(statement)] += count_change
+                statement = parent_statements.get(id(statement))
+        
+        results.extend(accepted)
     
     return results
 
@@ -339,33 +506,144 @@ def transform_ast(ast_node, find_pattern_func, find_operator, replacement_func):
     Returns:
         Transformed AST
     """
-    # Deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
+    # Find all expressions to transform (read only - original AST isn't modified, so no copy needed)
+    # (match inside another one is replaced along with it)
+    expressions = drop_nested_nodes(find_nodes(ast_node, find_pattern_func, find_operator))
     
-    # Find all expressions to transform
-    expressions = find_nodes(modified_ast, find_pattern_func, find_operator)
+    return replace_nodes(ast_node, expressions, replacement_func, find_operator)
+
+def drop_nested_nodes(nodes):
+    """
+    Leave out nodes inside another one of given nodes
     
-    # Nothing to change
-    if not expressions:
-        return modified_ast
+    Args:
+        nodes: AST nodes in source order (pre-order - outer node comes before nodes inside it)
+        
+    Returns:
+        List of outermost nodes
+    """
+    results = []
+    end = -1
+    for node in nodes:
+        if node["start_byte"] < end:
+            continue
+        results.append(node)
+        end = node["end_byte"]
     
-    root_text = modified_ast["text"] # get root text
+    return results
+
+def splice_text(source, base, start, end, patches):
+    """
+    Text of source[start:end] with patches applied
     
-    # Process transformations in reverse order (to avoid position shifting issues)
-    for expr in sorted(expressions, key=lambda x: x["start_byte"], reverse=True):
-        # Get original text and its position
-        start_pos = expr["start_byte"]
-        end_pos = expr["end_byte"]
+    Args:
+        source: memoryview of utf-8 encoded root text
+        base: start_byte of root
+        start, end: byte positions of text (same as node positions)
+        patches: (start, end, new utf-8 bytes) inside text, in source order and not overlapping
         
-        # Create replacement text
-        replacement_text = replacement_func(expr, find_operator)
+    Returns:
+        patched text (str)
+    """
+    parts = []
+    cursor = start
+    for patch_start, patch_end, patch_bytes in patches:
+        parts.append(source[cursor - base:patch_start - base])
+        parts.append(patch_bytes)
+        cursor = patch_end
+    parts.append(source[cursor - base:end - base])
+    
+    return b"".join(parts).decode("utf-8")
+
+def patch_node_text(node, source, base, patches):
+    """
+    Copy of node with patches applied to its text and text of nodes below it
+    (only nodes containing a patch are copied, others are shared with the original node)
+    
+    Args:
+        node: AST node
+        source: memoryview of utf-8 encoded root text
+        base: start_byte of root
+        patches: (start, end, new utf-8 bytes) inside node, in source order and not overlapping
+        
+    Returns:
+        patched node
+    """
+    patched = None
+    
+    # explicit stack instead of recursion, children pushed in reverse -> copied children stay in source order
+    stack = [(node, None)]
+    while stack:
+        current, siblings = stack.pop()
+        start, end = current["start_byte"], current["end_byte"]
+        node_patches = [patch for patch in patches if start <= patch[0] and patch[1] <= end]
         
-        # Replace in root text
-        root_text = root_text[:start_pos] + replacement_text + root_text[end_pos:]
+        if not node_patches:
+            copy = current
+        elif node_patches[0][:2] == (start, end):
+            # whole node replaced -> nodes below it aren't part of new text
+            copy = {**current, "text": node_patches[0][2].decode("utf-8")}
+        else:
+            copy = {**current, "text": splice_text(source, base, start, end, node_patches), "children": []}
+            for child in reversed(current.get("children", [])):
+                stack.append((child, copy["children"]))
         
-    modified_ast["text"] = root_text # update root text
+        if siblings is None:
+            patched = copy
+        else:
+            siblings.append(copy)
     
-    return modified_ast
+    return patched
+
+def replace_nodes(ast_node, expressions, replacement_func, operator):
+    """
+    Replace text of given nodes in root text
+    A node inside another one is replaced first and its replacement becomes part of the
+    outer node's text, which is then replaced as a whole
+    
+    Args:
+        ast_node: root AST node
+        expressions: nodes to replace
+        replacement_func: Function to determine replacement pattern
+        operator: Operator passed on to replacement_func
+        
+    Returns:
+        Transformed AST (same AST if there's nothing to replace)
+    """
+    # Nothing to change
+    if not expressions:
+        return ast_node
+    
+    # byte positions index into utf-8 encoded source (not into python string)
+    # and are relative to start of whole file (root text starts at root start_byte)
+    # memoryview -> unchanged slices aren't copied until final join
+    source = memoryview(ast_node["text"].encode("utf-8"))
+    base = ast_node["start_byte"]
+    
+    # sort outer nodes before the ones inside them and find nodes directly inside each node
+    expressions = sorted(expressions, key=lambda x: (x["start_byte"], -x["end_byte"]))
+    nested = {id(expr): [] for expr in expressions}
+    top_level = []
+    enclosing = []
+    for expr in expressions:
+        while enclosing and expr["start_byte"] >= enclosing[-1]["end_byte"]:
+            enclosing.pop()
+        (nested[id(enclosing[-1])] if enclosing else top_level).append(expr)
+        enclosing.append(expr)
+    
+    # inner nodes come after their outer node -> reversed order creates inner replacements first
+    replacements = {}
+    for expr in reversed(expressions):
+        patches = [(inner["start_byte"], inner["end_byte"], replacements[id(inner)]) for inner in nested[id(expr)]]
+        patched_expr = patch_node_text(expr, source, base, patches) if patches else expr
+        replacements[id(expr)] = replacement_func(patched_expr, operator).encode("utf-8")
+    
+    # Build new text from unchanged slices and replacements in source order
+    # (joined once at the end instead of copying whole root text for every replacement)
+    patches = [(expr["start_byte"], expr["end_byte"], replacements[id(expr)]) for expr in top_level]
+    
+    # only root text changes -> shallow copy of root with new text
+    return {**ast_node, "text": splice_text(source, base, base, base + len(source), patches)}
 
 def create_expanded_assignment(node, compound_op):
     """
@@ -386,11 +664,7 @@ def create_expanded_assignment(node, compound_op):
     binary_op = COMPOUND_TO_BINARY[compound_op]
     
     # Add parentheses around right operand if it's a complex expression to preserve operator precedence
-    needs_parentheses = right_node["type"] in [
-        "binary_expression", 
-        "conditional_expression", 
-        "logical_expression"
-    ]
+    needs_parentheses = right_node["type"] in PARENTHESIZED_OPERAND_TYPES
     
     # Also check if right expression starts with an operator that needs parentheses
     if not needs_parentheses and value_expr and value_expr[0] in "+-":
@@ -432,6 +706,22 @@ def create_compound_assignment(node, binary_op):
     
     return f"{var_expr} {compound_op} {value_expr}"
 
+def get_compound_operator(node):
+    """Compound operator of a compound assignment node (i += j -> +=)"""
+    return node["children"][1]["type"]
+
+def get_expanded_operator(node):
+    """Binary operator of an expanded assignment node (i = i + j -> +)"""
+    return node["children"][2]["children"][1]["type"]
+
+def create_any_expanded_assignment(node, operators):
+    """Create expanded assignment using compound operator of the node itself"""
+    return create_expanded_assignment(node, get_compound_operator(node))
+
+def create_any_compound_assignment(node, operators):
+    """Create compound assignment using binary operator of the node itself"""
+    return create_compound_assignment(node, get_expanded_operator(node))
+
 # Generic transformation functions for compound assignment
 def transform_compound_to_expanded(ast_node, compound_op):
     """Transform compound assignment to expanded form (i += j to i = i + j)"""
@@ -451,86 +741,55 @@ def transform_expanded_to_compound(ast_node, binary_op):
         create_compound_assignment
     )
 
-# Specific transformation functions for each operator
-def transform_plus_equal_to_expanded(ast_node):
-    """Transform i += j to i = i + j"""
-    return transform_compound_to_expanded(ast_node, "+=")
-
-def transform_expanded_to_plus_equal(ast_node):
-    """Transform i = i + j to i += j"""
-    return transform_expanded_to_compound(ast_node, "+")
-
-def transform_minus_equal_to_expanded(ast_node):
-    """Transform i -= j to i = i - j"""
-    return transform_compound_to_expanded(ast_node, "-=")
-
-def transform_expanded_to_minus_equal(ast_node):
-    """Transform i = i - j to i -= j"""
-    return transform_expanded_to_compound(ast_node, "-")
-
-def transform_multiply_equal_to_expanded(ast_node):
-    """Transform i *= j to i = i * j"""
-    return transform_compound_to_expanded(ast_node, "*=")
-
-def transform_expanded_to_multiply_equal(ast_node):
-    """Transform i = i * j to i *= j"""
-    return transform_expanded_to_compound(ast_node, "*")
-
-def transform_divide_equal_to_expanded(ast_node):
-    """Transform i /= j to i = i / j"""
-    return transform_compound_to_expanded(ast_node, "/=")
-
-def transform_expanded_to_divide_equal(ast_node):
-    """Transform i = i / j to i /= j"""
-    return transform_expanded_to_compound(ast_node, "/")
-
-def transform_modulo_equal_to_expanded(ast_node):
-    """Transform i %= j to i = i % j"""
-    return transform_compound_to_expanded(ast_node, "%=")
-
-def transform_expanded_to_modulo_equal(ast_node):
-    """Transform i = i % j to i %= j"""
-    return transform_expanded_to_compound(ast_node, "%")
-
-def transform_left_shift_equal_to_expanded(ast_node):
-    """Transform i <<= j to i = i << j"""
-    return transform_compound_to_expanded(ast_node, "<<=")
-
-def transform_expanded_to_left_shift_equal(ast_node):
-    """Transform i = i << j to i <<= j"""
-    return transform_expanded_to_compound(ast_node, "<<")
-
-def transform_right_shift_equal_to_expanded(ast_node):
-    """Transform i >>= j to i = i >> j"""
-    return transform_compound_to_expanded(ast_node, ">>=")
-
-def transform_expanded_to_right_shift_equal(ast_node):
-    """Transform i = i >> j to i >>= j"""
-    return transform_expanded_to_compound(ast_node, ">>")
-
-def transform_bitand_equal_to_expanded(ast_node):
-    """Transform i &= j to i = i & j"""
-    return transform_compound_to_expanded(ast_node, "&=")
-
-def transform_expanded_to_bitand_equal(ast_node):
-    """Transform i = i & j to i &= j"""
-    return transform_expanded_to_compound(ast_node, "&")
-
-def transform_bitor_equal_to_expanded(ast_node):
-    """Transform i |= j to i = i | j"""
-    return transform_compound_to_expanded(ast_node, "|=")
-
-def transform_expanded_to_bitor_equal(ast_node):
-    """Transform i = i | j to i |= j"""
-    return transform_expanded_to_compound(ast_node, "|")
+# All operators in a single pass (one traversal and one text rebuild instead of one per operator)
+# operators are handled in order of ALL_COMPOUND_OPS -> same result as applying the per-operator
+# transformations below one after another
+def transform_compound_to_expanded_all(ast_node, compound_ops=COMPOUND_OPS_SET):
+    """Transform compound assignments with any of given operators to expanded form (i += j, i -= j, ... to i = i + j, ...)"""
+    operators = [op for op in ALL_COMPOUND_OPS if op in compound_ops]
+    expressions = find_nodes_in_operator_order(
+        ast_node,
+        is_any_compound_assignment,
+        operators,
+        get_compound_operator,
+        -1  # compound assignment is gone once expanded
+    )
+    return replace_nodes(ast_node, expressions, create_any_expanded_assignment, operators)
 
-def transform_bitxor_equal_to_expanded(ast_node):
-    """Transform i ^= j to i = i ^ j"""
-    return transform_compound_to_expanded(ast_node, "^=")
+def transform_expanded_to_compound_all(ast_node, binary_ops=BINARY_TO_COMPOUND):
+    """Transform expanded forms with any of given operators to compound assignment (i = i + j, ... to i += j, ...)"""
+    operators = [COMPOUND_TO_BINARY[op] for op in ALL_COMPOUND_OPS if COMPOUND_TO_BINARY[op] in binary_ops]
+    expressions = find_nodes_in_operator_order(
+        ast_node,
+        is_any_expanded_assignment,
+        operators,
+        get_expanded_operator,
+        1  # every rewritten match is a new compound assignment
+    )
+    return replace_nodes(ast_node, expressions, create_any_compound_assignment, operators)
 
-def transform_expanded_to_bitxor_equal(ast_node):
-    """Transform i = i ^ j to i ^= j"""
-    return transform_expanded_to_compound(ast_node, "^")
+# Specific transformation functions for each operator
+# (operator bound with partial - module level, so they can still be sent to worker processes)
+transform_plus_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="+=")  # i += j -> i = i + j
+transform_expanded_to_plus_equal = partial(transform_expanded_to_compound, binary_op="+")  # i = i + j -> i += j
+transform_minus_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="-=")  # i -= j -> i = i - j
+transform_expanded_to_minus_equal = partial(transform_expanded_to_compound, binary_op="-")  # i = i - j -> i -= j
+transform_multiply_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="*=")  # i *= j -> i = i * j
+transform_expanded_to_multiply_equal = partial(transform_expanded_to_compound, binary_op="*")  # i = i * j -> i *= j
+transform_divide_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="/=")  # i /= j -> i = i / j
+transform_expanded_to_divide_equal = partial(transform_expanded_to_compound, binary_op="/")  # i = i / j -> i /= j
+transform_modulo_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="%=")  # i %= j -> i = i % j
+transform_expanded_to_modulo_equal = partial(transform_expanded_to_compound, binary_op="%")  # i = i % j -> i %= j
+transform_left_shift_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="<<=")  # i <<= j -> i = i << j
+transform_expanded_to_left_shift_equal = partial(transform_expanded_to_compound, binary_op="<<")  # i = i << j -> i <<= j
+transform_right_shift_equal_to_expanded = partial(transform_compound_to_expanded, compound_op=">>=")  # i >>= j -> i = i >> j
+transform_expanded_to_right_shift_equal = partial(transform_expanded_to_compound, binary_op=">>")  # i = i >> j -> i >>= j
+transform_bitand_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="&=")  # i &= j -> i = i & j
+transform_expanded_to_bitand_equal = partial(transform_expanded_to_compound, binary_op="&")  # i = i & j -> i &= j
+transform_bitor_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="|=")  # i |= j -> i = i | j
+transform_expanded_to_bitor_equal = partial(transform_expanded_to_compound, binary_op="|")  # i = i | j -> i |= j
+transform_bitxor_equal_to_expanded = partial(transform_compound_to_expanded, compound_op="^=")  # i ^= j -> i = i ^ j
+transform_expanded_to_bitxor_equal = partial(transform_expanded_to_compound, binary_op="^")  # i = i ^ j -> i ^= j
 
 def transform_file(input_ast_path, output_ast_path, transformation_function):
     """
@@ -543,14 +802,12 @@ def transform_file(input_ast_path, output_ast_path, transformation_function):
     """
     try:
         # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         modified_ast = transformation_function(ast) # apply transformation
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
             
         # print(f"Transformed {input_ast_path} -> {output_ast_path}")
         
@@ -560,6 +817,39 @@ def transform_file(input_ast_path, output_ast_path, transformation_function):
         import traceback
         print(traceback.format_exc())
 
+def transform_file_fused(input_ast_path, output_ast_path, transformation_functions, parse_function):
+    """
+    transform single AST file using several transformation functions one after another
+    (AST stays in memory between transformations - only read and written once)
+    
+    Args:
+        input_ast_path: Path to input AST file
+        output_ast_path: Path to save transformed AST
+        transformation_functions: Functions to apply to AST (in order)
+        parse_function: Function parsing C++ code to AST json (e.g. extract_ast.parse_to_table)
+    """
+    try:
+        # Load AST from file
+        ast = load_ast(input_ast_path)
+        
+        for transformation_function in transformation_functions:
+            modified_ast = transformation_function(ast) # apply transformation
+            
+            # transformations only change root text (node positions are stale afterwards)
+            # -> parse changed code again before next transformation (same as extracting it again from file)
+            if modified_ast is not ast:
+                modified_ast = restore_ast(parse_function(modified_ast["text"]))
+            ast = modified_ast
+        
+        # Save modified AST
+        save_ast(ast, output_ast_path)
+        
+    except Exception as e:
+        print(f"Error transforming {input_ast_path}: {e}")
+        # Log full error traceback for debugging
+        import traceback
+        print(traceback.format_exc())
+
 def transform_directory(input_dir, output_dir, transformation_function):
     """
     Transform all AST files in a directory using specified transformation function
@@ -569,95 +859,76 @@ def transform_directory(input_dir, output_dir, transformation_function):
         output_dir: Directory to save transformed AST files
         transformation_function: Function to apply to ASTs
     """
+    worker = partial(transform_file, transformation_function=transformation_function)
+    map_ast_files(input_dir, output_dir, worker)
+
+def transform_directory_fused(input_dir, output_dir, transformation_functions, parse_function):
+    """
+    Transform all AST files in a directory using several transformation functions one after another
+    (no intermediate AST files between transformations)
+    
+    Args:
+        input_dir: Directory containing input AST files
+        output_dir: Directory to save transformed AST files
+        transformation_functions: Functions to apply to ASTs (in order)
+        parse_function: Module level function parsing C++ code to AST json (e.g. extract_ast.parse_to_table)
+    """
+    worker = partial(transform_file_fused, transformation_functions=list(transformation_functions),
+                     parse_function=parse_function)
+    map_ast_files(input_dir, output_dir, worker)
+
+def map_ast_files(input_dir, output_dir, worker):
+    """
+    Call worker(input path, output path) for every AST file in input directory
+    
+    Args:
+        input_dir: Directory containing input AST files
+        output_dir: Directory to save transformed AST files
+        worker: Module level function (or partial of one) transforming a single file
+    """
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Process each AST file in input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path, transformation_function)
+    # Collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            input_paths.append(entry.path)
+            output_paths.append(os.path.join(output_dir, entry.name))
+
+    # files are independent -> spread them across all cores
+    # (transformation functions are module level, so they can be sent to worker processes)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(worker, input_paths, output_paths, chunksize=32))
 
 # Functions to be called from transform_ast.py
 # Compound to expanded form transformations
-def apply_plus_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i += j to i = i + j transformation"""
-    transform_directory(input_dir, output_dir, transform_plus_equal_to_expanded)
-
-def apply_minus_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i -= j to i = i - j transformation"""
-    transform_directory(input_dir, output_dir, transform_minus_equal_to_expanded)
-
-def apply_multiply_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i *= j to i = i * j transformation"""
-    transform_directory(input_dir, output_dir, transform_multiply_equal_to_expanded)
-
-def apply_divide_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i /= j to i = i / j transformation"""
-    transform_directory(input_dir, output_dir, transform_divide_equal_to_expanded)
-
-def apply_modulo_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i %= j to i = i % j transformation"""
-    transform_directory(input_dir, output_dir, transform_modulo_equal_to_expanded)
-
-def apply_left_shift_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i <<= j to i = i << j transformation"""
-    transform_directory(input_dir, output_dir, transform_left_shift_equal_to_expanded)
-
-def apply_right_shift_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i >>= j to i = i >> j transformation"""
-    transform_directory(input_dir, output_dir, transform_right_shift_equal_to_expanded)
-
-def apply_bitand_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i &= j to i = i & j transformation"""
-    transform_directory(input_dir, output_dir, transform_bitand_equal_to_expanded)
-
-def apply_bitor_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i |= j to i = i | j transformation"""
-    transform_directory(input_dir, output_dir, transform_bitor_equal_to_expanded)
-
-def apply_bitxor_equal_to_expanded_transformation(input_dir, output_dir):
-    """Apply i ^= j to i = i ^ j transformation"""
-    transform_directory(input_dir, output_dir, transform_bitxor_equal_to_expanded)
+apply_plus_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_plus_equal_to_expanded)
+apply_minus_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_minus_equal_to_expanded)
+apply_multiply_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_multiply_equal_to_expanded)
+apply_divide_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_divide_equal_to_expanded)
+apply_modulo_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_modulo_equal_to_expanded)
+apply_left_shift_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_left_shift_equal_to_expanded)
+apply_right_shift_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_right_shift_equal_to_expanded)
+apply_bitand_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_bitand_equal_to_expanded)
+apply_bitor_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_bitor_equal_to_expanded)
+apply_bitxor_equal_to_expanded_transformation = partial(transform_directory, transformation_function=transform_bitxor_equal_to_expanded)
+
+# All operators in a single pass
+apply_compound_to_expanded_all_transformation = partial(transform_directory, transformation_function=transform_compound_to_expanded_all)
+apply_expanded_to_compound_all_transformation = partial(transform_directory, transformation_function=transform_expanded_to_compound_all)
 
 # Expanded form to compound transformations
-def apply_expanded_to_plus_equal_transformation(input_dir, output_dir):
-    """Apply i = i + j to i += j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_plus_equal)
-
-def apply_expanded_to_minus_equal_transformation(input_dir, output_dir):
-    """Apply i = i - j to i -= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_minus_equal)
-
-def apply_expanded_to_multiply_equal_transformation(input_dir, output_dir):
-    """Apply i = i * j to i *= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_multiply_equal)
-
-def apply_expanded_to_divide_equal_transformation(input_dir, output_dir):
-    """Apply i = i / j to i /= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_divide_equal)
-
-def apply_expanded_to_modulo_equal_transformation(input_dir, output_dir):
-    """Apply i = i % j to i %= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_modulo_equal)
-
-def apply_expanded_to_left_shift_equal_transformation(input_dir, output_dir):
-    """Apply i = i << j to i <<= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_left_shift_equal)
-
-def apply_expanded_to_right_shift_equal_transformation(input_dir, output_dir):
-    """Apply i = i >> j to i >>= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_right_shift_equal)
-
-def apply_expanded_to_bitand_equal_transformation(input_dir, output_dir):
-    """Apply i = i & j to i &= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_bitand_equal)
-
-def apply_expanded_to_bitor_equal_transformation(input_dir, output_dir):
-    """Apply i = i | j to i |= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_bitor_equal)
-
-def apply_expanded_to_bitxor_equal_transformation(input_dir, output_dir):
-    """Apply i = i ^ j to i ^= j transformation"""
-    transform_directory(input_dir, output_dir, transform_expanded_to_bitxor_equal)
\ No newline at end of file
+apply_expanded_to_plus_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_plus_equal)
+apply_expanded_to_minus_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_minus_equal)
+apply_expanded_to_multiply_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_multiply_equal)
+apply_expanded_to_divide_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_divide_equal)
+apply_expanded_to_modulo_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_modulo_equal)
+apply_expanded_to_left_shift_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_left_shift_equal)
+apply_expanded_to_right_shift_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_right_shift_equal)
+apply_expanded_to_bitand_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_bitand_equal)
+apply_expanded_to_bitor_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_bitor_equal)
+apply_expanded_to_bitxor_equal_transformation = partial(transform_directory, transformation_function=transform_expanded_to_bitxor_equal)
@@ -1,9 +1,11 @@
 # Sofia Deichert - Code Transformation Project
 # Unary Operator Transformations
 
-import json
-import copy
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from transformations.ast_io import load_ast, save_ast, save_source
 
 # transformation types
 INCREMENT = "++"
@@ -11,6 +13,15 @@ DECREMENT = "--"
 PLUS_ONE = "+ 1"
 MINUS_ONE = "- 1"
 
+# nodes that can't contain update/assignment expressions -> children aren't searched
+SKIP_SUBTREE_TYPES = frozenset([
+    "comment",
+    "string_literal",
+    "raw_string_literal",
+    "char_literal",
+    "system_lib_string"
+])
+
 def get_variable_expression(node):
     """
     Extract variable expression text (could be 'i' or 'a[j]' etc.)
@@ -27,139 +38,73 @@ def get_variable_expression(node):
         return node["text"]
     return None
 
+# binary operator of each assignment pattern ("var = var + 1" / "var = var - 1")
+ASSIGNMENT_BINARY_OPERATORS = {PLUS_ONE: "+", MINUS_ONE: "-"}
+
 def is_update_expression(node, operator):
     """Check if node is an update expression with the specified operator (++ or --)"""
-    if (node["type"] == "update_expression" and 
-            len(node["children"]) == 2 and
-            node["children"][1]["type"] == operator and
-            node["children"][1]["text"] == operator):
-        
-        # Check if first child is valid variable expression
-        var_expr = get_variable_expression(node["children"][0])
-        return var_expr is not None
+    # cheap type check first - almost all nodes fail here
+    # (node types are interned on load, so == against literals compares by identity)
+    if node["type"] != "update_expression":
+        return False
+    
+    children = node["children"]
+    if len(children) != 2:
+        return False
     
-    return False
+    op_node = children[1]
+    if op_node["type"] != operator or op_node["text"] != operator:
+        return False
+    
+    # Check if first child is valid variable expression
+    return get_variable_expression(children[0]) is not None
 
 def is_assignment_expression(node, operator):
     """Check if node is an assignment with the specified operator (+ 1 or - 1)"""
-    if (node["type"] == "assignment_expression" and len(node["children"]) == 3):
-        left_node = node["children"][0]
-        assign_op = node["children"][1]
-        right_node = node["children"][2]
-        
-        # Get var expression (could be 'i' or 'a[j]')
-        left_expr = get_variable_expression(left_node)
-        if left_expr is None:
-            return False
-        
-        if (assign_op["type"] == "=" and 
-            right_node["type"] == "binary_expression" and 
-            len(right_node["children"]) == 3):
-            
-            right_expr = right_node["children"][0]
-            right_op = right_node["children"][1]
-            right_num = right_node["children"][2]
-            
-            # Check if it's pattern "var = var + 1" or "var = var - 1"
-            op_type = ("+" if operator == PLUS_ONE else "-")
-            
-            # Extract right side variable expression
-            right_var_expr = get_variable_expression(right_expr)
-            if right_var_expr is None:
-                return False
-            
-            return (right_op["type"] == op_type and
-                    right_num["type"] == "number_literal" and
-                    right_num["text"] == "1" and
-                    left_expr == right_var_expr)  # Same var on both sides
-    
-    return False
-
-def should_skip_node(node, ast_node):
-    """
-    Check if a node should be skipped for transformation.
-    This includes:
-    1. Nodes inside subscript expressions (array indices)
-    2. Nodes that are part of a binary expression (like i++ < T)
+    # cheap type checks first - almost all nodes fail here
+    if node["type"] != "assignment_expression":
+        return False
     
-    Args:
-        node: The node to check
-        ast_node: The root node to search from
-        
-    Returns:
-        bool: True if the node should be skipped, False otherwise
-    """
-    def is_in_subscript(current_node, target_start, target_end):
-        # Check if current node is subscript_argument_list
-        if current_node["type"] == "subscript_argument_list":
-            # Check if target node's position is within this subscript
-            if (current_node["start_byte"] <= target_start and 
-                current_node["end_byte"] >= target_end):
-                return True
-                
-        # Check all children recursively
-        for child in current_node.get("children", []):
-            if is_in_subscript(child, target_start, target_end):
-                return True
-                
+    children = node["children"]
+    if len(children) != 3:
         return False
     
-    def is_part_of_binary_expression(current_node, target_start, target_end):
-        # If this is binary expression (like a < b, a + b, etc.)
-        if current_node["type"] == "binary_expression":
-            # Check if target node is a direct child of this binary expression
-            for child in current_node.get("children", []):
-                if (child["start_byte"] <= target_start and
-                    child["end_byte"] >= target_end):
-                    # Target is within this child of a binary expression
-                    return True
-        
-        # Check all children recursively
-        for child in current_node.get("children", []):
-            if is_part_of_binary_expression(child, target_start, target_end):
-                return True
-                
+    left_node, assign_op, right_node = children
+    if assign_op["type"] != "=" or right_node["type"] != "binary_expression":
         return False
-        
-    # Run both checks - should skip if either is true
-    return (is_in_subscript(ast_node, node["start_byte"], node["end_byte"]) or
-            is_part_of_binary_expression(ast_node, node["start_byte"], node["end_byte"]))
-
-def find_nodes(ast_node, pattern_func, operator, results=None, parent_root=None):
-    """
-    function to find nodes matching a specific pattern
     
-    Args:
-        ast_node: The AST node to search
-        pattern_func: Function that checks if a node matches the pattern
-        operator: Operator to look for (++, --, + 1, - 1)
-        results: List to collect results (internal use)
-        parent_root: The root AST node for context checks (internal use)
-        
-    Returns:
-        List of nodes matching pattern
-    """
-    if results is None:
-        results = []
+    right_children = right_node["children"]
+    if len(right_children) != 3:
+        return False
     
-    if parent_root is None:
-        parent_root = ast_node
+    right_expr, right_op, right_num = right_children
     
-    # Check if this node matches pattern
-    if pattern_func(ast_node, operator):
-        # Skip nodes that should not be transformed (in subscripts or binary expressions)
-        if not should_skip_node(ast_node, parent_root):
-            results.append(ast_node)
+    # Check if it's pattern "var = var + 1" or "var = var - 1"
+    if (right_op["type"] != ASSIGNMENT_BINARY_OPERATORS[operator] or
+            right_num["type"] != "number_literal" or
+            right_num["text"] != "1"):
+        return False
     
-    # Recursively search children
-    for child in ast_node.get("children", []):
-        find_nodes(child, pattern_func, operator, results, parent_root)
+    # Get var expressions (could be 'i' or 'a[j]')
+    left_expr = get_variable_expression(left_node)
+    if left_expr is None:
+        return False
     
-    return results
+    # Same var on both sides
+    return left_expr == get_variable_expression(right_expr)
+
+# node type each pattern function can match (checked inline before calling it)
+PATTERN_NODE_TYPES = {
+    is_update_expression: "update_expression",
+    is_assignment_expression: "assignment_expression"
+}
 
 def transform_ast(ast_node, find_pattern_func, find_operator, replacement_func, replacement_operator):
     """
     transformation function for AST nodes
+    Skips nodes that should not be transformed:
+    1. Nodes inside subscript expressions (array indices)
+    2. Nodes that are part of a binary expression (like i++ < T)
     
     Args:
         ast_node: The AST node to transform
@@ -171,39 +116,55 @@ def transform_ast(ast_node, find_pattern_func, find_operator, replacement_func,
     Returns:
         Transformed AST
     """
-    # Deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
-    
-    # Find all expressions to transform
-    expressions = find_nodes(modified_ast, find_pattern_func, find_operator)
-    
-    # Nothing to change
-    if not expressions:
-        return modified_ast
+    # byte positions index into utf-8 encoded source (not into python string)
+    # and are relative to start of whole file (root text starts at root start_byte)
+    # memoryview -> unchanged slices aren't copied until final join
+    source = memoryview(ast_node["text"].encode("utf-8"))
+    base = ast_node["start_byte"]
     
-    root_text = modified_ast["text"] # get root text
+    # Single pass over AST (read only - original AST isn't modified, so no copy needed):
+    # - each node carries whether it's inside a subscript / binary expression
+    # - children pushed in reverse -> matches come in source order, so new text is built
+    #   from unchanged slices and replacements right away and joined once at the end
+    # only nodes of pattern's type are passed to it (saves a call per node)
+    match_type = PATTERN_NODE_TYPES.get(find_pattern_func)
     
-    # Process transformations in reverse order (to avoid position shifting issues)
-    for expr in sorted(expressions, key=lambda x: x["start_byte"], reverse=True):
-        # Get original text and its position
-        start_pos = expr["start_byte"]
-        end_pos = expr["end_byte"]
-        
-        # Get var expression - could be 'i' or 'a[j]'
-        if find_pattern_func == is_update_expression:
-            var_expr = get_variable_expression(expr["children"][0])
-        else:  # is_assignment_expression
-            var_expr = get_variable_expression(expr["children"][0])
-        
-        # create replacement text
-        replacement_text = replacement_func(var_expr, replacement_operator)
+    parts = []
+    cursor = 0
+    stack = [(ast_node, False, False)]
+    while stack:
+        node, in_subscript, in_binary = stack.pop()
         
-        # Replace in root text
-        root_text = root_text[:start_pos] + replacement_text + root_text[end_pos:]
+        # Check if this node matches pattern and isn't in a subscript or binary expression
+        if (not in_subscript and not in_binary and
+                (match_type is None or node["type"] == match_type) and
+                find_pattern_func(node, find_operator)):
+            # Get var expression - could be 'i' or 'a[j]' (first child for both update and assignment)
+            var_expr = get_variable_expression(node["children"][0])
+            
+            # create replacement text
+            parts.append(source[cursor:node["start_byte"] - base])
+            parts.append(replacement_func(var_expr, replacement_operator).encode("utf-8"))
+            cursor = node["end_byte"] - base
+            
+            # expressions inside are replaced along with this one
+            continue
         
-    modified_ast["text"] = root_text # update root text
+        children = node.get("children")
+        if children and node["type"] not in SKIP_SUBTREE_TYPES:
+            in_subscript = in_subscript or node["type"] == "subscript_argument_list"
+            in_binary = in_binary or node["type"] == "binary_expression"
+            for child in reversed(children):
+                stack.append((child, in_subscript, in_binary))
+    
+    # Nothing to change
+    if not parts:
+        return ast_node
     
-    return modified_ast
+    parts.append(source[cursor:])
+        
+    # only root text changes -> shallow copy of root with new text
+    return {**ast_node, "text": b"".join(parts).decode("utf-8")}
 
 def create_assignment_replacement(var_expr, operator):
     """Create replacement text for assignment expression"""
@@ -254,7 +215,7 @@ def transform_assignment_to_decrement(ast_node):
         DECREMENT                 
     )
 
-def transform_file(input_ast_path, output_ast_path, transformation_function):
+def transform_file(input_ast_path, output_ast_path, transformation_function, text_only=False):
     """
     Transforms single AST file using specified transformation function
     
@@ -262,17 +223,19 @@ def transform_file(input_ast_path, output_ast_path, transformation_function):
         input_ast_path: Path to input AST file
         output_ast_path: Path to save transformed AST
         transformation_function: Function to apply to AST
+        text_only: Only save transformed code as .cpp next to output_ast_path (no AST json)
     """
     try:
         # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         modified_ast = transformation_function(ast) # apply transformation
         
-        # save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        # save modified AST (or only its code)
+        if text_only:
+            save_source(modified_ast, output_ast_path)
+        else:
+            save_ast(modified_ast, output_ast_path)
             
         # print(f"Transformed {input_ast_path} -> {output_ast_path}")
         
@@ -282,7 +245,7 @@ def transform_file(input_ast_path, output_ast_path, transformation_function):
         import traceback
         print(traceback.format_exc())
 
-def transform_directory(input_dir, output_dir, transformation_function):
+def transform_directory(input_dir, output_dir, transformation_function, text_only=False):
     """
     Transforms all AST files in directory using specified transformation function
     
@@ -290,30 +253,39 @@ def transform_directory(input_dir, output_dir, transformation_function):
         input_dir: Directory containing input AST files
         output_dir: Directory to save transformed AST files
         transformation_function: Function to apply to ASTs
+        text_only: Only save transformed code (.cpp files, same as reconstruct_source.py output)
     """
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Process each AST file in input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path, transformation_function)
+    # Collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+
+    # files are independent -> spread them across all cores
+    # (transformation functions are module level, so they can be sent to worker processes)
+    worker = partial(transform_file, transformation_function=transformation_function, text_only=text_only)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(worker, input_paths, output_paths, chunksize=32))
 
 # Functions to be called from transform_ast.py
-def apply_increment_to_assignment_transformation(input_dir, output_dir):
+def apply_increment_to_assignment_transformation(input_dir, output_dir, text_only=False):
     """Apply var++ to var = var + 1 transformation"""
-    transform_directory(input_dir, output_dir, transform_increment_to_assignment)
+    transform_directory(input_dir, output_dir, transform_increment_to_assignment, text_only)
 
-def apply_decrement_to_assignment_transformation(input_dir, output_dir):
+def apply_decrement_to_assignment_transformation(input_dir, output_dir, text_only=False):
     """Apply var-- to var = var - 1 transformation"""
-    transform_directory(input_dir, output_dir, transform_decrement_to_assignment)
+    transform_directory(input_dir, output_dir, transform_decrement_to_assignment, text_only)
 
-def apply_assignment_to_increment_transformation(input_dir, output_dir):
+def apply_assignment_to_increment_transformation(input_dir, output_dir, text_only=False):
     """Apply var = var + 1 to var ++ transformation"""
-    transform_directory(input_dir, output_dir, transform_assignment_to_increment)
+    transform_directory(input_dir, output_dir, transform_assignment_to_increment, text_only)
 
-def apply_assignment_to_decrement_transformation(input_dir, output_dir):
+def apply_assignment_to_decrement_transformation(input_dir, output_dir, text_only=False):
     """Apply var = var - 1 to var -- transformation"""
-    transform_directory(input_dir, output_dir, transform_assignment_to_decrement)
\ No newline at end of file
+    transform_directory(input_dir, output_dir, transform_assignment_to_decrement, text_only)
\ No newline at end of file
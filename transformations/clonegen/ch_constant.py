@@ -3,202 +3,222 @@
 # for example: 8 to (12 - 4) 
 
 from transformations.clonegen.expression_generator import generate_equivalent_expression
-import json
-import copy
+from transformations.ast_io import load_ast, save_ast, save_source
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-def is_safe_to_transform(node, ast_node):
-    """check if a number literal is safe to transform"""
-    # skip non-integer numbers
-    value = node["text"]
-    
+# common bit patterns (skipped in bitwise expressions)
+BITMASK_VALUES = frozenset(['1', '2', '4', '8', '16', '32', '64', '128', '256', '512', '1024', '2048', '4096', '8192'])
+
+BITWISE_OPERATORS = frozenset(["&", "|", "^", "<<", ">>"])
+
+TEMPLATE_LIST_TYPES = frozenset(["template_argument_list", "template_parameter_list"])
+
+# nodes that can't contain number literals -> children aren't searched
+SKIP_SUBTREE_TYPES = frozenset([
+    "comment",
+    "string_literal",
+    "raw_string_literal",
+    "char_literal",
+    "system_lib_string"
+])
+
+def is_plain_integer(value):
+    """check if number literal text is a plain decimal integer (cheap string checks only)"""
     # skip floating point, scientific notation
-    if '.' in value or 'e' in value.lower():
+    if '.' in value or 'e' in value or 'E' in value:
         return False
         
-    # skip hexadecimal/octal/binary literals
-    if value.startswith(('0x', '0X', '0b', '0B')) or (len(value) > 1 and value.startswith('0')):
+    # skip hexadecimal/octal/binary literals (all start with 0)
+    if len(value) > 1 and value[0] == '0':
+        return False
+    
+    return True
+
+def is_safe_to_transform(node, parents, in_preprocessor=False, in_template=False):
+    """
+    check if a number literal is safe to transform
+    
+    Args:
+        node: number_literal node
+        parents: result of build_parent_map
+        in_preprocessor: literal is inside a preprocessor directive (from find_number_literals)
+        in_template: literal is inside template parameters/arguments (from find_number_literals)
+    """
+    # skip non-integer numbers - string checks first, ancestor walk only for literals that pass them
+    value = node["text"]
+    if not is_plain_integer(value):
         return False
     
     # check if in preprocessor directive
-    if is_in_preprocessor_directive(node, ast_node):
+    if in_preprocessor:
         return False
     
     # Check if in template parameters
-    if is_in_template_parameters(node, ast_node):
+    if in_template:
         return False
     
     # Check if appears to be a bitmask (common bit patterns)
-    bitmask_patterns = ['1', '2', '4', '8', '16', '32', '64', '128', '256', '512', '1024', '2048', '4096', '8192']
-    if value in bitmask_patterns and could_be_bitmask_context(node, ast_node):
+    if value in BITMASK_VALUES and could_be_bitmask_context(node, parents):
         return False
         
     return True
 
-def is_in_preprocessor_directive(node, ast_node):
-    # In Tree-sitter ASTs, preprocessor directives often have types like: preproc_include, preproc_define, etc.
-    def check_preprocessor_recursive(current_node):
-        if current_node.get("type", "").startswith("preproc_"):
-            return True
-            
-        # If we can identify the position of the node in the source code,
-        # we can check if it appears on a line that starts with #
-        if "start_line" in current_node and "start_line" in node:
-            if current_node["start_line"] == node["start_line"] and current_node["text"].lstrip().startswith("#"):
-                return True
-        
-        # check children
-        for child in current_node.get("children", []):
-            if check_preprocessor_recursive(child):
-                return True
-                
-        return False
-    
-    return check_preprocessor_recursive(ast_node)
-
-def is_in_template_parameters(node, ast_node):
-    # In Tree-sitter ASTs, template parameters are typically represented by nodes with type like template_argument_list
-    def check_template_recursive(current_node, target_start, target_end):
-        if current_node["type"] in ["template_argument_list", "template_parameter_list"]:
-            # Check if the target node's position is within this template
-            if (current_node["start_byte"] <= target_start and 
-                current_node["end_byte"] >= target_end):
-                return True
-                
-        # check all children recursively
-        for child in current_node.get("children", []):
-            if check_template_recursive(child, target_start, target_end):
-                return True
-                
-        return False
-    
-    return check_template_recursive(ast_node, node["start_byte"], node["end_byte"])
+def build_parent_map(ast_node):
+    """map id of each node to its parent node (built once per AST, so context checks can walk up)"""
+    parents = {}
+    stack = [ast_node]
+    while stack:
+        current = stack.pop()
+        for child in current.get("children", []):
+            parents[id(child)] = current
+            stack.append(child)
+    
+    return parents
 
-def could_be_bitmask_context(node, ast_node):
+def could_be_bitmask_context(node, parents):
     # look for bitwise operators (&, |, ^, ~, <<, >>) in parent expr
-    def check_parent_for_bitwise(current_node, target_start, target_end, depth=0):
-        if depth > 3:  # limit search depth
-            return False
-            
+    current_node = node
+    for depth in range(4):  # limit search depth (node itself + 3 parents)
         # check if this node contains bitwise operators
         if current_node["type"] == "binary_expression":
             for child in current_node.get("children", []):
-                if child["type"] in ["&", "|", "^", "<<", ">>"]:
-                    # Check if our target is within this expression
-                    if (current_node["start_byte"] <= target_start and 
-                        current_node["end_byte"] >= target_end):
-                        return True
+                if child["type"] in BITWISE_OPERATORS:
+                    return True
         
-        # check parent recursively
-        for child in ast_node.get("children", []):
-            if child != current_node and "start_byte" in child and "end_byte" in child:
-                if (child["start_byte"] <= current_node["start_byte"] and 
-                    child["end_byte"] >= current_node["end_byte"]):
-                    return check_parent_for_bitwise(child, target_start, target_end, depth+1)
-                    
-        return False
+        # check parent
+        current_node = parents.get(id(current_node))
+        if current_node is None:
+            break
     
-    return check_parent_for_bitwise(node, node["start_byte"], node["end_byte"])
+    return False
 
 def transform_number_literals(ast_node):
-    """recursively transform number literals in AST"""
-    # Deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
+    """transform number literals in AST (original AST isn't modified - only root text changes)"""
+    # new text of each number literal to replace, in source order
+    replacements = []
+    
+    num_nodes = find_number_literals(ast_node)
     
-    if modified_ast["type"] == "number_literal":
-        original_value = modified_ast["text"]
+    # bitmask check walks up from literal instead of searching whole AST again
+    # (parent map only needed if some literal passes the string checks)
+    needs_context = any(is_plain_integer(num_node["text"]) for num_node, _, _ in num_nodes)
+    parents = build_parent_map(ast_node) if needs_context else {}
+    
+    for num_node, in_preprocessor, in_template in num_nodes:
+        original_value = num_node["text"]
         
-        if is_safe_to_transform(modified_ast, ast_node):
+        if is_safe_to_transform(num_node, parents, in_preprocessor, in_template):
             try:
                 expression = generate_equivalent_expression(original_value)
-                
-                # Update node's text with new expression
-                modified_ast["text"] = expression
+                replacements.append((num_node, expression))
             except Exception as e:
                 # if any error occurs, keep original value
                 print(f"Error transforming number {original_value}: {e}")
-        
-        return modified_ast
     
-    # process children recursively
-    if "children" in modified_ast:
-        for i, child in enumerate(modified_ast["children"]):
-            modified_ast["children"][i] = transform_number_literals(child)
+    # Nothing to change
+    if not replacements:
+        return ast_node
     
-    # If this is the root node (translation_unit), update its text
-    if modified_ast["type"] == "translation_unit":
-        # Reconstruct full text from all transformed components
-        reconstruct_text(modified_ast)
-    
-    return modified_ast
+    # shallow copy of root with reconstructed text (children are shared with original AST)
+    return {**ast_node, "text": reconstruct_text(ast_node, replacements)}
 
-def reconstruct_text(node):
-    """recursively reconstruct the text property of a node based on its children"""
-    if "children" not in node or not node["children"]:
-        return
-    
-    # Update children first
-    for child in node["children"]:
-        reconstruct_text(child)
-    
-    # If this is a node with children, reconstruct its text
-    if node["type"] == "translation_unit":
-        # For root node, we need to update the entire text
-        original_text = node["text"]
-        
-        # Start with the original text
-        new_text = original_text
-        
-        # find all number_literal nodes and replace them in reverse order (to avoid position shifting issues)
-        number_nodes = find_number_literals(node)
-        for num_node in sorted(number_nodes, key=lambda x: x["start_byte"], reverse=True):
-            start_pos = num_node["start_byte"] - node["start_byte"]
-            end_pos = num_node["end_byte"] - node["start_byte"]
-            
-            # replace num with its transformed expression
-            new_text = new_text[:start_pos] + num_node["text"] + new_text[end_pos:]
+def reconstruct_text(node, replacements):
+    """
+    reconstruct text of a node with number literals replaced
+    
+    Args:
+        node: root node whose text is rebuilt
+        replacements: list of (number_literal node, new text)
+    
+    Returns:
+        new text of node
+    """
+    # byte positions index into utf-8 encoded source (not into python string)
+    # memoryview -> unchanged slices aren't copied until final join
+    source = memoryview(node["text"].encode("utf-8"))
+    
+    # collect unchanged slices and expressions in source order, join once at the end
+    # (instead of copying whole text for every number)
+    parts = []
+    cursor = 0
+    for num_node, expression in sorted(replacements, key=lambda x: x[0]["start_byte"]):
+        start_pos = num_node["start_byte"] - node["start_byte"]
+        end_pos = num_node["end_byte"] - node["start_byte"]
         
-        node["text"] = new_text # update node's text
-
-def find_number_literals(node, results=None):
-    if results is None:
-        results = []
+        # replace num with its transformed expression
+        parts.append(source[cursor:start_pos])
+        parts.append(expression.encode("utf-8"))
+        cursor = end_pos
     
-    if node["type"] == "number_literal":
-        results.append(node)
+    parts.append(source[cursor:])
     
-    # recursively search children
-    for child in node.get("children", []):
-        find_number_literals(child, results)
+    return b"".join(parts).decode("utf-8")
+
+def find_number_literals(node):
+    """
+    find all number_literal nodes below node (in source order)
+    
+    Returns:
+        list of (number_literal node, inside preprocessor directive, inside template parameters)
+    """
+    results = []
+    
+    # explicit stack instead of recursion, children pushed in reverse -> pre-order like before
+    # each node carries whether it's inside a preprocessor directive / template parameter list
+    # (instead of searching for them again for every literal)
+    stack = [(node, False, False)]
+    while stack:
+        current, in_preprocessor, in_template = stack.pop()
+        if current["type"] == "number_literal":
+            results.append((current, in_preprocessor, in_template))
+        
+        children = current.get("children")
+        if children and current["type"] not in SKIP_SUBTREE_TYPES:
+            # In Tree-sitter ASTs, preprocessor directives have types like: preproc_include, preproc_def, etc.
+            # and template parameters are in template_argument_list/template_parameter_list
+            in_preprocessor = in_preprocessor or current["type"].startswith("preproc_")
+            in_template = in_template or current["type"] in TEMPLATE_LIST_TYPES
+            for child in reversed(children):
+                stack.append((child, in_preprocessor, in_template))
     
     return results
 
-def transform_file(input_ast_path, output_ast_path):
+def transform_file(input_ast_path, output_ast_path, text_only=False):
     try:
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         modified_ast = transform_number_literals(ast)
         
-        # save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        # save modified AST (or only its code as .cpp if text_only is set)
+        if text_only:
+            save_source(modified_ast, output_ast_path)
+        else:
+            save_ast(modified_ast, output_ast_path)
             
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
         import traceback
         print(traceback.format_exc())
 
-def transform_directory(input_dir, output_dir):
+def transform_directory(input_dir, output_dir, text_only=False):
     os.makedirs(output_dir, exist_ok=True)
     
-    # process each AST file in input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path)
+    # collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+    
+    # files are independent -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(partial(transform_file, text_only=text_only), input_paths, output_paths, chunksize=32))
 
-def apply_ch_constant_transformation(input_dir, output_dir):
+def apply_ch_constant_transformation(input_dir, output_dir, text_only=False):
     # Set random seed for reproducibility if desired: random.seed(42)
-    transform_directory(input_dir, output_dir)
\ No newline at end of file
+    # text_only: write transformed code (.cpp) instead of AST json
+    transform_directory(input_dir, output_dir, text_only)
\ No newline at end of file
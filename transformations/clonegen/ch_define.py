@@ -2,9 +2,46 @@
 # ch-define: modifications to variable definitions
 # for example: int b = 0; to int b; b = 0;
 
-import json
-import copy
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import orjson
+
+from transformations.ast_io import has_node_type, restore_ast, save_ast
+
+# statements whose header/condition declarations are skipped
+CONTROL_STATEMENT_TYPES = frozenset({"for_statement", "if_statement", "while_statement"})
+
+# children of a for_statement that are not part of its header (everything else is init/condition/update,
+# or a body without braces)
+FOR_NON_HEADER_TYPES = frozenset({"for", "(", ")", ";", "compound_statement"})
+
+# characters that matter when splitting a declaration into variables / finding an initializer
+SPLIT_CHAR_PATTERN = re.compile(r"[()\[\]{},]")
+EQUALS_CHAR_PATTERN = re.compile(r"[()\[\]=]")
+WHITESPACE_PATTERN = re.compile(r"\s*")
+
+# first child of a declaration that is its whole type specifier
+TYPE_SPECIFIER_TYPES = frozenset({"primitive_type", "qualified_identifier", "template_type", "struct", "class", "enum"})
+
+# children of a declaration that start its variable list
+VARIABLE_NODE_TYPES = frozenset({"identifier", "init_declarator"})
+
+# text before first ( of an initializer (type name of a constructor call, or called function)
+CALLEE_PATTERN = re.compile(r"\s*([^(]*)\(")
+
+# name directly followed by first < (like vector<), not a comparison
+TEMPLATE_NAME_PATTERN = re.compile(r"[^<]*\w<")
+
+# function calls in initializers that aren't constructor calls
+KNOWN_FUNCTIONS = frozenset({"GCD", "gcd", "min", "max", "abs", "sin", "cos", "tan", "sqrt", "pow",
+                             "log", "exp", "floor", "ceil", "round"})
+
+# standard containers anywhere in template type (substring match, e.g. also multimap)
+STANDARD_CONTAINER_PATTERN = re.compile(r"vector|map|set|unordered_map|unordered_set")
 
 def is_pointer_type(type_specifier, var_name):
     """Check if type is a pointer type (which should be handled carefully)"""
@@ -22,57 +59,21 @@ def is_init_declarator(node):
     """Check if node is an init_declarator (has a variable initialization)"""
     return node["type"] == "init_declarator" and len(node.get("children", [])) >= 3
 
-def is_inside_control_header(node, ast_node):
-    """check if a declaration is inside a for/while/if condition or header (we want to skip transformations in these contexts)"""
-    def is_inside_node_type(current_node, node_start, node_end, types):
-        """Helper function to check if node is inside specific node types"""
-        if current_node["type"] in types:
-            # Check if current node contains our target node
-            if (current_node["start_byte"] <= node_start and 
-                current_node["end_byte"] >= node_end):
-                
-                # for for loops -> check if node is initialization part
-                if current_node["type"] == "for_statement":
-                    for child in current_node.get("children", []):
-                        # skip keyword "for" and parentheses
-                        if child["type"] in ["for", "(", ")", ";", "compound_statement"]:
-                            continue
-                        
-                        # If this is the initialization and it contains our node, then our node is in control header
-                        if (child["start_byte"] <= node_start and 
-                            child["end_byte"] >= node_end):
-                            return True
-                
-                # For if/while statements, check if it's in condition clause
-                elif current_node["type"] in ["if_statement", "while_statement"]:
-                    for child in current_node.get("children", []):
-                        if child["type"] == "condition_clause":
-                            if (child["start_byte"] <= node_start and 
-                                child["end_byte"] >= node_end):
-                                return True
-                
-            # Check children recursively
-            for child in current_node.get("children", []):
-                if is_inside_node_type(child, node_start, node_end, types):
-                    return True
-                    
-        # If this node is not a control statement, check all children
-        elif current_node.get("children"):
-            for child in current_node.get("children", []):
-                if is_inside_node_type(child, node_start, node_end, types):
-                    return True
-                
-        return False
+def is_control_header_child(parent, child):
+    """check if child of a for/if/while node is its header or condition (we want to skip transformations in these contexts)"""
+    parent_type = parent["type"]
+    
+    # for loops -> everything but keyword, parentheses, semicolons and block body
+    if parent_type == "for_statement":
+        return child["type"] not in FOR_NON_HEADER_TYPES
+    
+    # if/while statements -> condition clause
+    if parent_type == "if_statement" or parent_type == "while_statement":
+        return child["type"] == "condition_clause"
     
-    # Check if inside for/if/while statements
-    return is_inside_node_type(
-        ast_node, 
-        node["start_byte"], 
-        node["end_byte"], 
-        ["for_statement", "if_statement", "while_statement"]
-    )
+    return False
 
-def is_eligible_declaration(node, ast_node):
+def is_eligible_declaration(node, in_control_header=False):
     """
     Check if declaration is eligible for transformation:
     - Must be type declaration
@@ -84,7 +85,7 @@ def is_eligible_declaration(node, ast_node):
         return False
     
     # check if it's inside a control header
-    if is_inside_control_header(node, ast_node):
+    if in_control_header:
         return False
     
     # Check if there's at least one initialization in declaration
@@ -128,12 +129,12 @@ def is_reference_type(type_specifier, var_name):
 
 def has_subscript_expression(node):
     """Check if a node contains subscript_expression (array operations)"""
-    if node["type"] == "subscript_expression":
-        return True
-        
-    for child in node.get("children", []):
-        if has_subscript_expression(child):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node["type"] == "subscript_expression":
             return True
+        stack.extend(node.get("children", ()))
             
     return False
 
@@ -152,54 +153,34 @@ def is_constructor_call(initializer):
     """
     if not initializer:
         return False
-        
-    initializer = initializer.strip() # basic check for parentheses
     
     # We want to identify actual constructor calls but not expressions in parentheses, function calls, or casts   
     # Constructor with type name like Type(args)
-    if '(' in initializer and ')' in initializer:
-        before_paren = initializer[:initializer.find('(')].strip()
-        
-        # Skip if it looks like a cast (type) expression, which can be safely transformed
-        if initializer.startswith('(') and ')' in initializer:
-            cast_end = initializer.find(')', 1)
-            if cast_end > 0 and cast_end < len(initializer) - 1:
-                return False  # This is likely a cast, not a constructor
-        
-        # If there's text before the parentheses that looks like a type name (starts with uppercase letter or contains ::) and is not a known function
-        known_functions = ["GCD", "gcd", "min", "max", "abs", "sin", "cos", "tan", "sqrt", "pow",
-                          "log", "exp", "floor", "ceil", "round"]
-        
-        if (before_paren and (before_paren[0].isupper() or '::' in before_paren) 
-                and not before_paren.isdigit() 
-                and before_paren not in known_functions):
-            return True
+    # (plain substring checks first - most initializers have no parentheses at all)
+    if '(' not in initializer or ')' not in initializer:
+        return False
+    match = CALLEE_PATTERN.match(initializer)
     
-    return False
+    # casts like (type) expr and parenthesized expressions have nothing before the parentheses
+    before_paren = match.group(1).rstrip()
+    
+    # If there's text before the parentheses that looks like a type name (starts with uppercase letter or contains ::) and is not a known function
+    return (bool(before_paren) and (before_paren[0].isupper() or '::' in before_paren)
+            and before_paren not in KNOWN_FUNCTIONS)
 
 def is_template_type(type_specifier):
     """Check if the type specifier contains template syntax like vector<int>
     This excludes comparison operators in expressions"""
     # Simple check for template syntax
-    if '<' in type_specifier and '>' in type_specifier:
-        # Ensure it's not just comparison operators
-        # For expressions like (10 ^ 5), we want to return false
-        open_angle_pos = type_specifier.find('<')
-        close_angle_pos = type_specifier.find('>')
-        
-        # Look for word characters before angle bracket
-        if open_angle_pos > 0:
-            char_before = type_specifier[open_angle_pos - 1]
-            if char_before.isalnum() or char_before == '_':
-                return True
-                
-        # If it's a comparison in a more complex expression, return false
-        if ' < ' in type_specifier or ' > ' in type_specifier:
-            return False
-            
+    if '<' not in type_specifier or '>' not in type_specifier:
+        return False
+    
+    # Look for word characters before (first) angle bracket
+    if TEMPLATE_NAME_PATTERN.match(type_specifier):
         return True
-        
-    return False
+    
+    # If it's a comparison in a more complex expression, return false
+    return ' < ' not in type_specifier and ' > ' not in type_specifier
 
 def is_array_type(var_decl, ast_node=None):
     """Check if a variable declaration is for an array type"""
@@ -223,43 +204,89 @@ def is_array_type(var_decl, ast_node=None):
     
     return False
 
+def split_declarations(declaration_text):
+    """Split declaration text by commas that aren't nested in parentheses, brackets or braces"""
+    var_declarations = []
+    start = 0
+    paren_level = 0
+    bracket_level = 0
+    brace_level = 0
+    
+    # regex jumps straight to the characters that matter (instead of looping over every character in python)
+    for match in SPLIT_CHAR_PATTERN.finditer(declaration_text):
+        char = match.group()
+        if char == '(':
+            paren_level += 1
+        elif char == ')':
+            paren_level -= 1
+        elif char == '[':
+            bracket_level += 1
+        elif char == ']':
+            bracket_level -= 1
+        elif char == '{':
+            brace_level += 1
+        elif char == '}':
+            brace_level -= 1
+        elif paren_level == 0 and bracket_level == 0 and brace_level == 0:
+            var_declarations.append(declaration_text[start:match.start()])
+            start = match.end()
+    
+    # Add last variable declaration
+    var_declarations.append(declaration_text[start:])
+    
+    return var_declarations
+
+def find_initializer_equals(var_decl):
+    """Find position of first = that isn't nested in parentheses or brackets (-1 if there's no initializer)"""
+    paren_level = 0
+    bracket_level = 0
+    
+    for match in EQUALS_CHAR_PATTERN.finditer(var_decl):
+        char = match.group()
+        if char == '(':
+            paren_level += 1
+        elif char == ')':
+            paren_level -= 1
+        elif char == '[':
+            bracket_level += 1
+        elif char == ']':
+            bracket_level -= 1
+        elif paren_level == 0 and bracket_level == 0:
+            return match.start()
+    
+    return -1
+
 def extract_type_and_identifiers(node):
     """Extract type specifier and all identifiers (initialized and non-initialized) from a declaration node."""
     type_specifier = ""
     identifiers = []
+    children = node.get("children", ())
+    
+    # Extract variables from original code text
+    orig_text = node["text"]
     
     # Find type specifier (first token before any identifier or comma)
-    for i, child in enumerate(node.get("children", [])):
-        if i == 0 and child["type"] in ["primitive_type", "qualified_identifier", "template_type", "struct", "class", "enum"]:
-            type_specifier = child["text"]
-            break
+    if children and children[0]["type"] in TYPE_SPECIFIER_TYPES:
+        type_specifier = children[0]["text"]
     
     # If no specific type node found, try to extract from text
-    if not type_specifier and node.get("children"):
+    if not type_specifier and children:
         # find first identifier or init_declarator position
         first_var_pos = None
-        for child in node.get("children", []):
-            if child["type"] in ["identifier", "init_declarator"]:
+        for child in children:
+            if child["type"] in VARIABLE_NODE_TYPES:
                 first_var_pos = child["start_byte"]
                 break
         
         if first_var_pos:
             # extract type from beginning to first variable
-            type_text = node["text"][0:first_var_pos - node["start_byte"]].strip()
-            type_specifier = type_text
+            type_specifier = orig_text[0:first_var_pos - node["start_byte"]].strip()
         else:
             # fallback to first child
-            type_specifier = node["children"][0]["text"]
+            type_specifier = children[0]["text"]
     
-    # Extract variables from original code text
-    orig_text = node["text"]
-    
-    # Find part after type specifier
-    type_end_pos = node["start_byte"] + len(type_specifier)
-    for c in orig_text[len(type_specifier):]:
-        if not c.isspace():
-            break
-        type_end_pos += 1
+    # Find part after type specifier (skipping whitespace without copying rest of text)
+    type_end_pos = WHITESPACE_PATTERN.match(orig_text, len(type_specifier)).end()
     
     # find position of ending semicolon
     semicolon_pos = orig_text.rfind(';')
@@ -267,37 +294,11 @@ def extract_type_and_identifiers(node):
     
     if semicolon_pos != -1:
         # extract declaration part (between type and semicolon)
-        declaration_text = orig_text[type_end_pos - node["start_byte"]:semicolon_pos]
+        declaration_text = orig_text[type_end_pos:semicolon_pos]
     
     if declaration_text:
         # Split by commas to get individual variable declarations
-        var_declarations = []
-        
-        # handle nested parentheses, brackets, etc. when splitting by commas
-        start = 0
-        paren_level = 0
-        bracket_level = 0
-        brace_level = 0
-        
-        for i, char in enumerate(declaration_text):
-            if char == '(':
-                paren_level += 1
-            elif char == ')':
-                paren_level -= 1
-            elif char == '[':
-                bracket_level += 1
-            elif char == ']':
-                bracket_level -= 1
-            elif char == '{':
-                brace_level += 1
-            elif char == '}':
-                brace_level -= 1
-            elif char == ',' and paren_level == 0 and bracket_level == 0 and brace_level == 0:
-                var_declarations.append(declaration_text[start:i])
-                start = i + 1
-        
-        # Add last variable declaration
-        var_declarations.append(declaration_text[start:])
+        var_declarations = split_declarations(declaration_text)
         
         # process each variable declaration
         for var_decl in var_declarations:
@@ -306,22 +307,7 @@ def extract_type_and_identifiers(node):
                 continue
                 
             # check if it has an initializer
-            equals_pos = -1
-            paren_level = 0
-            bracket_level = 0
-            
-            for i, char in enumerate(var_decl):
-                if char == '(':
-                    paren_level += 1
-                elif char == ')':
-                    paren_level -= 1
-                elif char == '[':
-                    bracket_level += 1
-                elif char == ']':
-                    bracket_level -= 1
-                elif char == '=' and paren_level == 0 and bracket_level == 0:
-                    equals_pos = i
-                    break
+            equals_pos = find_initializer_equals(var_decl)
             
             if equals_pos != -1:
                 # Has initializer
@@ -334,7 +320,7 @@ def extract_type_and_identifiers(node):
             else:
                 # No initializer
                 is_array = is_array_type(var_decl, node)
-                identifiers.append((var_decl.strip(), None, is_array, False, False))
+                identifiers.append((var_decl, None, is_array, False, False))
     
     return type_specifier, identifiers
 
@@ -358,8 +344,12 @@ def create_replacement(type_specifier, identifiers):
     else:
         return declaration
 
-def should_skip_transformation(type_specifier, var_name, initializer, is_array, is_init_list, is_constructor):
-    """Determine if a specific variable initialization should be skipped for transformation"""
+@lru_cache(maxsize=4096)
+def is_non_transformable_type(type_specifier):
+    """
+    Check the parts of should_skip_transformation that only depend on the type specifier
+    (cached - the same few type strings like int or long long come up in every file)
+    """
     # Skip const variables (must be initialized at declaration)
     if has_const_qualifier(type_specifier):
         return True
@@ -368,12 +358,35 @@ def should_skip_transformation(type_specifier, var_name, initializer, is_array,
     if has_static_qualifier(type_specifier):
         return True
         
-    # Skip reference types (must be initialized at declaration)
-    if is_reference_type(type_specifier, var_name):
+    # Skip reference/pointer types (& or * in type)
+    if is_reference_type(type_specifier, "") or is_pointer_type(type_specifier, ""):
+        return True
+    
+    # use more targeted template detection - only skip for complex template parameters
+    if is_template_type(type_specifier):
+        # skip only if it's a complex template (has nested templates)
+        nested_template_level = type_specifier.count('<')
+        if nested_template_level > 1:  # More than one level of template nesting
+            return True
+        # for single-level templates, check if it's a standard container
+        if STANDARD_CONTAINER_PATTERN.search(type_specifier):
+            if ',' in type_specifier:  # has multiple template parameters
+                return True
+    
+    return False
+
+def should_skip_transformation(type_specifier, var_name, initializer, is_array, is_init_list, is_constructor):
+    """Determine if a specific variable initialization should be skipped for transformation"""
+    # Skip const/static/reference/pointer/complex template types
+    if is_non_transformable_type(type_specifier):
+        return True
+        
+    # Skip reference types (must be initialized at declaration) - & with variable name
+    if is_reference_type("", var_name):
         return True
         
-    # Skip pointer types (should be handled cautiously)
-    if is_pointer_type(type_specifier, var_name):
+    # Skip pointer types (should be handled cautiously) - * with variable name
+    if is_pointer_type("", var_name):
         return True
         
     # skip array types (complex to transform)
@@ -387,94 +400,118 @@ def should_skip_transformation(type_specifier, var_name, initializer, is_array,
     # skip constructor calls w/ potential side effects
     if is_constructor:
         return True
-    
-    # use more targeted template detection - only skip for complex template parameters
-    if is_template_type(type_specifier):
-        # skip only if it's a complex template (has nested templates)
-        nested_template_level = type_specifier.count('<')
-        if nested_template_level > 1:  # More than one level of template nesting
-            return True
-        # for single-level templates, check if it's a standard container
-        standard_containers = ["vector", "map", "set", "unordered_map", "unordered_set"]
-        if any(container in type_specifier for container in standard_containers):
-            if ',' in type_specifier:  # has multiple template parameters
-                return True
         
     return False
 
 def transform_variable_definitions(ast_node):
     """transform variable definitions in AST from combined declaration with initialization to separate declaration and assignment"""
-    # Deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
-    
-    # Find all eligible declarations
-    eligible_declarations = find_eligible_declarations(modified_ast, modified_ast)
-    
-    # nothing to change
-    if not eligible_declarations:
-        return modified_ast
-    
-    root_text = modified_ast["text"] # get root text
-    
-    # process declarations in reverse order (to avoid position shifting issues)
-    for decl in sorted(eligible_declarations, key=lambda x: x["start_byte"], reverse=True):
-        # extract type and identifiers
-        type_specifier, identifiers = extract_type_and_identifiers(decl)
+    # AST is only read - rewritten declarations are collected as (start_byte, end_byte, replacement text)
+    # and spliced into root text once at the end
+    patches = []
+    
+    # single walk: eligible declarations are turned into patches as soon as they're found
+    # (whether a node is in a control header is passed down from for/if/while ancestors)
+    # explicit stack instead of recursion (deep ASTs hit recursion limit)
+    # children pushed in reverse -> nodes visited (and patches collected) in source order
+    stack = [(ast_node, False)]
+    while stack:
+        node, in_control_header = stack.pop()
+        node_type = node["type"]
         
-        # check if all initializations should be skipped
-        all_skipped = True
-        has_init = False
-        
-        for var_name, initializer, is_array, is_init_list, is_constructor in identifiers:
-            if initializer:
-                has_init = True
-                if not should_skip_transformation(type_specifier, var_name, initializer, is_array, is_init_list, is_constructor):
-                    all_skipped = False
-                    break
+        # check if this node is eligible declaration
+        if node_type == "declaration" and is_eligible_declaration(node, in_control_header):
+            patch = create_declaration_patch(node)
+            if patch:
+                patches.append(patch)
+                # declarations nested in this one (e.g. inside a lambda initializer) are part of its replacement
+                continue
         
-        # skip if no initializations were found or if all initializations should be skipped
-        if not has_init or all_skipped:
+        children = node.get("children", ())
+        if not children:
             continue
         
-        # get original text and its position
-        start_pos = decl["start_byte"]
-        end_pos = decl["end_byte"]
-        
-        # create replacement text
-        replacement_text = create_replacement(type_specifier, identifiers)
-        
-        # replace in root text
-        root_text = root_text[:start_pos] + replacement_text + root_text[end_pos:]
+        # only children of for/if/while can start a control header
+        if in_control_header or node_type not in CONTROL_STATEMENT_TYPES:
+            stack.extend([(child, in_control_header) for child in reversed(children)])
+        else:
+            for child in reversed(children):
+                stack.append((child, is_control_header_child(node, child)))
     
-    # update AST root text
-    modified_ast["text"] = root_text
+    # nothing to change
+    if not patches:
+        return ast_node
     
-    return modified_ast
+    # shallow copy - children are shared with the input AST (only root text is used downstream)
+    return {**ast_node, "text": apply_patches(ast_node, patches)}
 
-def find_eligible_declarations(ast_node, root_node, results=None):
-    """find all declarations that are eligible for transformation"""
-    if results is None:
-        results = []
+def create_declaration_patch(decl):
+    """
+    Create patch splitting an eligible declaration into declaration and assignments
+    
+    Returns:
+        (start_byte, end_byte, replacement text), None if declaration should not be transformed
+    """
+    # extract type and identifiers
+    type_specifier, identifiers = extract_type_and_identifiers(decl)
     
-    # check if this node is eligible declaration
-    if is_eligible_declaration(ast_node, root_node):
-        results.append(ast_node)
+    # check if all initializations should be skipped
+    all_skipped = True
+    has_init = False
+    
+    for var_name, initializer, is_array, is_init_list, is_constructor in identifiers:
+        if initializer:
+            has_init = True
+            if not should_skip_transformation(type_specifier, var_name, initializer, is_array, is_init_list, is_constructor):
+                all_skipped = False
+                break
     
-    # recursively search children
-    for child in ast_node.get("children", []):
-        find_eligible_declarations(child, root_node, results)
+    # skip if no initializations were found or if all initializations should be skipped
+    if not has_init or all_skipped:
+        return None
     
-    return results
+    # create replacement text
+    return decl["start_byte"], decl["end_byte"], create_replacement(type_specifier, identifiers)
+
+def apply_patches(ast_node, patches):
+    """
+    Build new root text with each (start_byte, end_byte, replacement text) patch applied
+    
+    Args:
+        ast_node: root node whose text is rebuilt
+        patches: list of non-overlapping (start_byte, end_byte, replacement text) in source order
+    
+    Returns:
+        new text of root node
+    """
+    # byte positions index into utf-8 encoded source (not into python string)
+    source = memoryview(ast_node["text"].encode("utf-8"))
+    base = ast_node["start_byte"]
+    
+    # unchanged slices and replacements in source order, joined once at the end
+    parts = []
+    cursor = 0
+    for start_pos, end_pos, replacement in patches:
+        parts.append(source[cursor:start_pos - base])
+        parts.append(replacement.encode("utf-8"))
+        cursor = end_pos - base
+    parts.append(source[cursor:])
+    
+    return b"".join(parts).decode("utf-8")
 
 def transform_file(input_ast_path, output_ast_path):
     try:
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast_bytes = Path(input_ast_path).read_bytes()
+        ast_json = orjson.loads(ast_bytes)
+        
+        # no declarations at all -> nothing to transform, file is copied as is
+        # (skips building the AST and serializing it again)
+        if not has_node_type(ast_json, "declaration"):
+            Path(output_ast_path).write_bytes(ast_bytes)
+            return
         
-        modified_ast = transform_variable_definitions(ast)
+        modified_ast = transform_variable_definitions(restore_ast(ast_json))
         
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
             
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
@@ -484,11 +521,18 @@ def transform_file(input_ast_path, output_ast_path):
 def transform_directory(input_dir, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path)
+    # collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+    
+    # files are independent -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(transform_file, input_paths, output_paths, chunksize=32))
 
 def apply_ch_define_transformation(input_dir, output_dir):
     transform_directory(input_dir, output_dir)
\ No newline at end of file
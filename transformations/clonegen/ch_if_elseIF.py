@@ -13,9 +13,13 @@
 # else BodyC }
 
 
-import json
-import copy
 import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import orjson
+
+from transformations.ast_io import has_node_type, restore_ast, save_ast
 
 def transform_if_elseif(ast_node):
     """
@@ -23,42 +27,55 @@ def transform_if_elseif(ast_node):
     1. Find all if statements with else_clause containing if_statement
     2. Transform them by adding braces around nested if
     """
-    modified_ast = copy.deepcopy(ast_node)
-    
     # Find all if_statement nodes with else_if in AST
-    if_elseif_nodes = find_if_elseif_statements(modified_ast)
+    if_elseif_nodes = find_if_elseif_statements(ast_node)
     
     # nothing to change
     if not if_elseif_nodes:
-        return modified_ast
-    
-    # Process transformations in reverse order (to avoid position shifting issues)
-    # Sort by start position so deeper nested structures get transformed first
-    for if_node in sorted(if_elseif_nodes, key=lambda x: x["start_byte"], reverse=True):
-        transform_single_if_elseif(modified_ast, if_node)
-    
-    return modified_ast
+        return ast_node
+    
+    # AST is only read - new else clauses are collected as (start_byte, end_byte, replacement bytes)
+    # byte positions index into utf-8 encoded source (not into python string)
+    source = ast_node["text"].encode("utf-8")
+    base = ast_node["start_byte"]
+    patches = []
+    
+    # Process transformations in reverse order
+    # nodes are found in source order (by start position) -> reversed, deeper nested structures get transformed first
+    # (their patches are then part of the nested if text of the enclosing else clause)
+    for if_node in reversed(if_elseif_nodes):
+        patch = transform_single_if_elseif(source, base, if_node, patches)
+        if patch:
+            patches.append(patch)
+    
+    # shallow copy - children are shared with the input AST (only root text is used downstream)
+    return {**ast_node, "text": splice_patches(source, base, ast_node["start_byte"], ast_node["end_byte"], patches).decode("utf-8")}
 
-def find_if_elseif_statements(ast_node, results=None):
-    """Recursively find all if_statement nodes with else_clause containing if_statement"""
-    if results is None:
-        results = []
-    
-    # Check if current node is if_statement with else_if
-    if ast_node["type"] == "if_statement":
-        # Look for else_clause that contains an if_statement
-        for child in ast_node.get("children", []):
-            if child["type"] == "else_clause":
-                # now look for if_statement inside the else_clause
-                for else_child in child.get("children", []):
-                    if else_child["type"] == "if_statement":
-                        # This is an else-if pattern
-                        results.append(ast_node)
-                        break
-    
-    # recursively search children
-    for child in ast_node.get("children", []):
-        find_if_elseif_statements(child, results)
+def find_if_elseif_statements(ast_node):
+    """Find all if_statement nodes with else_clause containing if_statement"""
+    results = []
+    
+    # explicit stack instead of recursion (long else-if chains nest deeply)
+    # children pushed in reverse -> nodes visited in source order
+    stack = [ast_node]
+    while stack:
+        node = stack.pop()
+        children = node.get("children", ())
+        
+        # Check if current node is if_statement with else_if
+        if node["type"] == "if_statement":
+            # Look for else_clause that contains an if_statement
+            for child in children:
+                if child["type"] == "else_clause":
+                    # now look for if_statement inside the else_clause
+                    for else_child in child.get("children", ()):
+                        if else_child["type"] == "if_statement":
+                            # This is an else-if pattern
+                            results.append(node)
+                            break
+        
+        if children:
+            stack.extend(reversed(children))
     
     return results
 
@@ -82,13 +99,51 @@ def find_else_if_statement(if_node):
     
     return else_clause, nested_if
 
-def transform_single_if_elseif(ast_root, if_node):
-    """Transform a single if-elseif structure by adding braces around the nested if"""
+def splice_patches(source, base, start_pos, end_pos, patches):
+    """
+    Get source bytes between start_pos and end_pos with all patches in that range applied
+    
+    Args:
+        source: utf-8 encoded root text
+        base: start_byte of root node
+        start_pos, end_pos: byte range to rebuild
+        patches: list of (start_byte, end_byte, replacement bytes)
+    
+    Returns:
+        rebuilt bytes
+    """
+    # unchanged slices and replacements in source order, joined once at the end
+    parts = []
+    cursor = start_pos
+    for patch_start, patch_end, replacement in sorted(patches):
+        # outside of range, or nested in a patch that already contains it
+        if patch_start < cursor or patch_end > end_pos:
+            continue
+        parts.append(source[cursor - base:patch_start - base])
+        parts.append(replacement)
+        cursor = patch_end
+    parts.append(source[cursor - base:end_pos - base])
+    
+    return b"".join(parts)
+
+def transform_single_if_elseif(source, base, if_node, patches):
+    """
+    Transform a single if-elseif structure by adding braces around the nested if
+    
+    Args:
+        source: utf-8 encoded root text
+        base: start_byte of root node
+        if_node: if_statement with else-if
+        patches: patches of if-elseif structures nested in this one (already transformed)
+    
+    Returns:
+        (start_byte, end_byte, replacement bytes) for else clause, None if not an if-elseif pattern
+    """
     # Find the else_clause and the if_statement within it
     else_clause, nested_if = find_else_if_statement(if_node)
     
     if not else_clause or not nested_if:
-        return  # Not an if-elseif pattern
+        return None  # Not an if-elseif pattern
     
     # Extract "else" keyword
     else_keyword = ""
@@ -97,83 +152,28 @@ def transform_single_if_elseif(ast_root, if_node):
             else_keyword = child["text"]
             break
     
-    # get nested if statement text
-    nested_if_text = nested_if["text"]
+    # get nested if statement text (with nested chains already transformed)
+    nested_if_text = splice_patches(source, base, nested_if["start_byte"], nested_if["end_byte"], patches)
     
     # Create new else_clause text w/ braces
-    new_else_clause_text = else_keyword + " { " + nested_if_text + " }"
+    new_else_clause_text = else_keyword.encode("utf-8") + b" { " + nested_if_text + b" }"
     
-    # Replace in root text
-    replace_text_in_ast(ast_root, else_clause["start_byte"], else_clause["end_byte"], new_else_clause_text)
-
-def replace_text_in_ast(node, start_pos, end_pos, replacement):
-    """Replace a substring of text in AST, starting at deepest node and propagating changes upward"""
-    # Check if this node contains replacement range
-    node_start = node.get("start_byte")
-    node_end = node.get("end_byte")
-    
-    if node_start is None or node_end is None:
-        return False
-    
-    # If replacement is fully contained in this node
-    if node_start <= start_pos and node_end >= end_pos:
-        # Check if any child contains replacement
-        child_replaced = False
-        for child in node.get("children", []):
-            if replace_text_in_ast(child, start_pos, end_pos, replacement):
-                child_replaced = True
-                break
-        
-        # If no child contained replacement or this node has no children, apply replacement to this node's text
-        if not child_replaced or not node.get("children"):
-            if node_start == start_pos and node_end == end_pos:
-                # direct replacement of node's text
-                node["text"] = replacement
-                return True
-            else:
-                # replace portion of node's text
-                prefix = node["text"][:start_pos - node_start]
-                suffix = node["text"][end_pos - node_start:]
-                node["text"] = prefix + replacement + suffix
-                return True
-        
-        # Update this node's text based on its children's text
-        if child_replaced and node.get("children"):
-            # Reconstruct this node's text from its children
-            # Preserve original whitespace as much as possible
-            current_pos = node_start
-            node_text = ""
-            
-            for child in node.get("children", []):
-                child_start = child.get("start_byte", current_pos)
-                # Add any whitespace between the previous child and this one
-                if child_start > current_pos:
-                    # try to preserve original spacing in the parent node
-                    original_spacing = node["text"][current_pos - node_start:child_start - node_start]
-                    node_text += original_spacing
-                
-                # add this child's text
-                node_text += child.get("text", "")
-                current_pos = child.get("end_byte", child_start + len(child.get("text", "")))
-            
-            # add any trailing text
-            if node_end > current_pos:
-                node_text += node["text"][current_pos - node_start:node_end - node_start]
-            
-            node["text"] = node_text
-            return True
-    
-    return False
+    return else_clause["start_byte"], else_clause["end_byte"], new_else_clause_text
 
 def transform_file(input_ast_path, output_ast_path):
     try:
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast_bytes = Path(input_ast_path).read_bytes()
+        ast_json = orjson.loads(ast_bytes)
+        
+        # no else clauses at all -> no else-if -> nothing to transform, file is copied as is
+        # (skips building the AST and serializing it again)
+        if not has_node_type(ast_json, "else_clause"):
+            Path(output_ast_path).write_bytes(ast_bytes)
+            return
         
-        modified_ast = transform_if_elseif(ast)
+        modified_ast = transform_if_elseif(restore_ast(ast_json))
         
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
         
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
@@ -183,11 +183,18 @@ def transform_file(input_ast_path, output_ast_path):
 def transform_directory(input_dir, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path)
+    # collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+    
+    # files are independent -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(transform_file, input_paths, output_paths, chunksize=32))
 
 def apply_ch_if_elseIF_transformation(input_dir, output_dir):
     transform_directory(input_dir, output_dir)
\ No newline at end of file
@@ -4,9 +4,13 @@
 # 1) a < b to b > a and vice versa
 # 2) a <= b to b >= a and vice versa
 
-import json
-import copy
 import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import orjson
+
+from transformations.ast_io import restore_ast, save_ast
 
 # map of relational operators to their opposites
 OPPOSITE_OPERATORS = {
@@ -16,92 +20,96 @@ OPPOSITE_OPERATORS = {
     ">=": "<="
 }
 
+# relational operator node types as they appear in AST json ("<" etc. including quotes)
+RELATIONAL_OPERATOR_MARKERS = tuple(orjson.dumps(op) for op in OPPOSITE_OPERATORS)
+
+# node types that (might) modify variables
+SIDE_EFFECT_TYPES = frozenset({"update_expression", "assignment_expression", "call_expression"})
+
+# operators allowed in safe operands
+ARITHMETIC_OPERATORS = frozenset({"+", "-", "*", "/", "%"})
+
+# tokens skipped when looking into parenthesized/subscript/pointer expressions
+PARENTHESES = frozenset({"(", ")"})
+BRACKETS = frozenset({"[", "]"})
+POINTER_OPERATORS = frozenset({"*", "&"})
+
 def has_side_effects(node):
     """
     Check if an expression has side effects that modify variables
     """
-    # Update expressions (increment/decrement) have side effects
-    if node["type"] == "update_expression":
-        return True
+    # explicit stack of parts still to check instead of recursion
+    # (expression has side effects if any of them has)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        node_type = node["type"]
         
-    # Assignment expressions have side effects
-    if node["type"] == "assignment_expression":
-        return True
-        
-    # Function calls might have side effects
-    if node["type"] == "call_expression":
-        return True
-    
-    # Check for assignment inside array access
-    if "text" in node and "=" in node["text"] and node["type"] != "binary_expression":
-        return True
+        # Update expressions (increment/decrement) and assignment expressions have side effects
+        # Function calls might have side effects
+        if node_type in SIDE_EFFECT_TYPES:
+            return True
         
-    # For binary expressions, check both operands
-    if node["type"] == "binary_expression":
-        # If operator is assignment (=, +=, -=, etc.), it has side effects
-        op_node = node["children"][1]
-        if "=" in op_node["text"]:
+        # Check for assignment inside array access
+        if "text" in node and "=" in node["text"] and node_type != "binary_expression":
             return True
         
-        # Check both sides recursively
-        return (has_side_effects(node["children"][0]) or 
-                has_side_effects(node["children"][2]))
-    
-    # For parenthesized expressions, check inside
-    if node["type"] == "parenthesized_expression":
-        for child in node.get("children", []):
-            if child["type"] not in ["(", ")"]:
-                return has_side_effects(child)
-        return False
-    
-    # For subscript expressions, check all parts
-    if node["type"] == "subscript_expression":
-        for child in node.get("children", []):
-            if child["type"] in ["[", "]"]:
-                continue
-                
-            if child["type"] == "subscript_argument_list":
-                for arg_child in child.get("children", []):
-                    if arg_child["type"] in ["[", "]"]:
-                        continue
-                    if has_side_effects(arg_child):
-                        return True
-            elif has_side_effects(child):
+        # For binary expressions, check both operands
+        if node_type == "binary_expression":
+            children = node["children"]
+            # If operator is assignment (=, +=, -=, etc.), it has side effects
+            if "=" in children[1]["text"]:
                 return True
-        return False
-    
-    # For pointer expressions, check the operand
-    if node["type"] == "pointer_expression":
-        for child in node.get("children", []):
-            if child["type"] not in ["*", "&"]:  # Skip pointer operators
-                return has_side_effects(child)
-        return False
+            
+            # left side popped (checked) first
+            stack.append(children[2])
+            stack.append(children[0])
+        
+        # For parenthesized expressions, check inside
+        elif node_type == "parenthesized_expression":
+            for child in node.get("children", ()):
+                if child["type"] not in PARENTHESES:
+                    stack.append(child)
+                    break
+        
+        # For subscript expressions, check all parts
+        elif node_type == "subscript_expression":
+            for child in node.get("children", ()):
+                if child["type"] in BRACKETS:
+                    continue
+                
+                if child["type"] == "subscript_argument_list":
+                    stack.extend([arg_child for arg_child in child.get("children", ()) if arg_child["type"] not in BRACKETS])
+                else:
+                    stack.append(child)
+        
+        # For pointer expressions, check the operand
+        elif node_type == "pointer_expression":
+            for child in node.get("children", ()):
+                if child["type"] not in POINTER_OPERATORS:  # Skip pointer operators
+                    stack.append(child)
+                    break
     
     # By default, no side effects
     return False
 
-def get_variables(node, vars_set=None):
+def get_variables(node):
     """
     Get all variables (identifiers) used in an expression
     """
-    if vars_set is None:
-        vars_set = set()
-    
-    # Base case: identifier is a variable
-    if node["type"] == "identifier":
-        vars_set.add(node["text"])
-        return vars_set
+    vars_set = set()
     
-    # For pointer expressions, get variables from operand
-    if node["type"] == "pointer_expression":
-        for child in node.get("children", []):
-            if child["type"] not in ["*", "&"]:  
-                get_variables(child, vars_set)
-        return vars_set
-    
-    # recursively check children
-    for child in node.get("children", []):
-        get_variables(child, vars_set)
+    # explicit stack instead of recursion
+    # (pointer operators * and & are tokens without identifiers, so every child can be searched)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        
+        # Base case: identifier is a variable
+        if node["type"] == "identifier":
+            vars_set.add(node["text"])
+        else:
+            stack.extend(node.get("children", ()))
     
     return vars_set
 
@@ -109,77 +117,74 @@ def is_safe_expression(node):
     """
     Check if an expression is safe to transform
     """
-    # Base cases: identifiers and literals are safe
-    if node["type"] in ["identifier", "number_literal"]:
-        return True
+    # explicit stack of parts still to check instead of recursion
+    # (expression is safe if all of them are)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        node_type = node["type"]
         
-    # Parenthesized expressions are safe if their content is safe
-    if node["type"] == "parenthesized_expression":
-        # Find actual expression inside parentheses
-        for child in node.get("children", []):
-            if child["type"] not in ["(", ")"]:  # Skip brackets
-                # Recursively check if inner expression is safe
-                return is_safe_expression(child)
-        # Empty parentheses or only brackets found (shouldn't happen in valid code)
-        return True
+        # Base cases: identifiers and literals are safe
+        if node_type == "identifier" or node_type == "number_literal":
+            continue
         
-    # Basic arithmetic operations are safe if operands are safe
-    if node["type"] == "binary_expression":
-        # Allow only arithmetic operators
-        op_node = node["children"][1]
-        if op_node["type"] in ["+", "-", "*", "/", "%"] and op_node["text"] in ["+", "-", "*", "/", "%"]:
-            # Both operands must be safe
-            return (is_safe_expression(node["children"][0]) and 
-                    is_safe_expression(node["children"][2]))
-        return False
+        # Parenthesized expressions are safe if their content is safe
+        if node_type == "parenthesized_expression":
+            # Find actual expression inside parentheses
+            # (Empty parentheses or only brackets found (shouldn't happen in valid code) are safe)
+            for child in node.get("children", ()):
+                if child["type"] not in PARENTHESES:  # Skip brackets
+                    stack.append(child)
+                    break
+            continue
         
-    # Subscript expressions are safe if the base and all indices are safe
-    if node["type"] == "subscript_expression":
-        # check all children
-        for child in node.get("children", []):
-            # skip brackets
-            if child["type"] in ["[", "]"]:
+        # Basic arithmetic operations are safe if operands are safe
+        if node_type == "binary_expression":
+            # Allow only arithmetic operators
+            children = node["children"]
+            op_node = children[1]
+            if op_node["type"] in ARITHMETIC_OPERATORS and op_node["text"] in ARITHMETIC_OPERATORS:
+                # Both operands must be safe
+                stack.append(children[2])
+                stack.append(children[0])
                 continue
+            return False
+        
+        # Subscript expressions are safe if the base and all indices are safe
+        if node_type == "subscript_expression":
+            for child in node.get("children", ()):
+                # skip brackets
+                if child["type"] in BRACKETS:
+                    continue
                 
-            # For argument lists, check each argument
-            if child["type"] == "subscript_argument_list":
-                for arg_child in child.get("children", []):
-                    # Skip brackets
-                    if arg_child["type"] in ["[", "]"]:
-                        continue
-                    
-                    # Check if argument is safe
-                    if not is_safe_expression(arg_child):
-                        return False
-            # Check if base expression is safe
-            elif not is_safe_expression(child):
-                return False
-        return True
-    
-    # Pointer expressions are safe if their operand is safe
-    if node["type"] == "pointer_expression":
-        # Check operand (the expression being pointed to or referenced)
-        for child in node.get("children", []):
-            if child["type"] not in ["*", "&"]:  # skip pointer operators
-                return is_safe_expression(child)
-        return True
-    
-    # Expressions w/ side effects require careful analysis but are not automatically unsafe for our purposes
-    if node["type"] in ["update_expression", "assignment_expression"]:
+                # For argument lists, check each argument
+                if child["type"] == "subscript_argument_list":
+                    stack.extend([arg_child for arg_child in child.get("children", ()) if arg_child["type"] not in BRACKETS])
+                # Check if base expression is safe
+                else:
+                    stack.append(child)
+            continue
+        
+        # Pointer expressions are safe if their operand is safe
+        if node_type == "pointer_expression":
+            # Check operand (the expression being pointed to or referenced)
+            for child in node.get("children", ()):
+                if child["type"] not in POINTER_OPERATORS:  # skip pointer operators
+                    stack.append(child)
+                    break
+            continue
+        
+        # Expressions w/ side effects require careful analysis but are not automatically unsafe for our purposes
         # These are handled differently in is_transformable_relational_expression
         # For individual safety, they're considered safe to appear on one side
-        return True
-    
-    # Function calls are not safe
-    if node["type"] == "call_expression":
+        if node_type == "update_expression" or node_type == "assignment_expression":
+            continue
+        
+        # Function calls are not safe, neither are assignment expressions inside array access
+        # By default, reject anything we don't explicitly recognize as safe
         return False
     
-    # Check for assignment expressions inside array access
-    if "text" in node and "=" in node["text"] and node["type"] != "binary_expression":
-        return False
-        
-    # By default, reject anything we don't explicitly recognize as safe
-    return False
+    return True
 
 def is_transformable_relational_expression(node):
     """
@@ -195,67 +200,53 @@ def is_transformable_relational_expression(node):
         
         # check if operator is a relational operator
         if op_node["type"] in OPPOSITE_OPERATORS and op_node["text"] in OPPOSITE_OPERATORS:
+            # each side is only walked once per check (instead of once per case below)
+            left_side_effects = has_side_effects(left_node)
+            right_side_effects = has_side_effects(right_node)
+            
             # Case 1: Both sides have no side effects - always safe to transform
-            if not has_side_effects(left_node) and not has_side_effects(right_node):
+            if not left_side_effects and not right_side_effects:
                 return is_safe_expression(left_node) and is_safe_expression(right_node)
             
-            # Case 2: Left side has side effects, right does not
-            if has_side_effects(left_node) and not has_side_effects(right_node):
-                # Get all variables used on both sides
-                left_vars = get_variables(left_node)
-                right_vars = get_variables(right_node)
-                
-                # If there are no shared variables, it's safe to transform
-                # This handles cases like: a++ < 5 (safe to transform to: 5 > a++)
-                if not left_vars.intersection(right_vars):
-                    return True
-                return False
-            
-            # Case 3: Right side has side effects, left does not
-            if has_side_effects(right_node) and not has_side_effects(left_node):
-                # Get all variables used on both sides
-                left_vars = get_variables(left_node)
-                right_vars = get_variables(right_node)
-                
-                # If there are no shared variables, it's safe to transform
-                # This handles cases like: 5 < a++ (safe to transform to: a++ > 5)
-                if not left_vars.intersection(right_vars):
-                    return True
+            # Case 4: Both sides have side effects - not safe to transform
+            if left_side_effects and right_side_effects:
                 return False
             
-            # Case 4: Both sides have side effects - not safe to transform
-            return False
+            # Case 2/3: One side has side effects, the other does not
+            # If there are no shared variables, it's safe to transform
+            # This handles cases like: a++ < 5 (safe to transform to: 5 > a++) and 5 < a++ (to: a++ > 5)
+            return get_variables(left_node).isdisjoint(get_variables(right_node))
     
     return False
 
-def find_relational_expressions(ast_node, results=None):
+def find_relational_expressions(ast_node):
     """
-    Recursively find all transformable relational expressions in AST
+    Find all transformable relational expressions in AST (in source order)
+    (expressions inside parentheses are found when searching the parenthesized_expression's children)
     """
-    if results is None:
-        results = []
-    
-    # Check if this node is transformable relational expression
-    if is_transformable_relational_expression(ast_node):
-        results.append(ast_node)
-    
-    # Special handling for parenthesized expressions
-    if ast_node["type"] == "parenthesized_expression":
-        for child in ast_node.get("children", []):
-            if child["type"] not in ["(", ")"] and is_transformable_relational_expression(child):
-                # Found a relational expression inside parentheses
-                child_copy = copy.deepcopy(child)
-                child_copy["inside_parentheses"] = True
-                child_copy["parent_start"] = ast_node["start_byte"]
-                child_copy["parent_end"] = ast_node["end_byte"]
-                results.append(child_copy)
+    results = []
     
-    # recursively search children
-    for child in ast_node.get("children", []):
-        find_relational_expressions(child, results)
+    # explicit stack instead of recursion (deep ASTs hit recursion limit)
+    # children pushed in reverse -> nodes visited in source order
+    stack = [ast_node]
+    while stack:
+        node = stack.pop()
+        
+        # Check if this node is transformable relational expression
+        if is_transformable_relational_expression(node):
+            results.append(node)
+        
+        children = node.get("children", ())
+        if children:
+            stack.extend(reversed(children))
     
     return results
 
+def is_relational_expression(node):
+    """Check if node is binary expression with a relational operator (<, >, <=, >=)"""
+    return (node["type"] == "binary_expression" and len(node["children"]) == 3 and
+            node["children"][1]["type"] in OPPOSITE_OPERATORS)
+
 def create_reversed_expression(node):
     """
     Create reversed relational expression (a < b to b > a)
@@ -269,6 +260,13 @@ def create_reversed_expression(node):
     op = op_node["text"]
     right_expr = right_node["text"]
     
+    # relational operators are left associative (1 <= a <= 10 is (1 <= a) <= 10)
+    # -> operand that is itself a relational expression keeps its grouping only in parentheses
+    if is_relational_expression(left_node):
+        left_expr = f"({left_expr})"
+    if is_relational_expression(right_node):
+        right_expr = f"({right_expr})"
+    
     # get opposite operator
     opposite_op = OPPOSITE_OPERATORS[op]
     
@@ -280,48 +278,59 @@ def transform_relational_expressions(ast_node):
     Transform all relational expressions in AST
     Swaps operands and changes operators to their opposites
     """
-    # Deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
-    
-    # Find all relational expressions to transform
-    expressions = find_relational_expressions(modified_ast)
+    # AST is only read - find all relational expressions to transform
+    expressions = find_relational_expressions(ast_node)
     
     # nothing to change
     if not expressions:
-        return modified_ast
+        return ast_node
     
-    # get root text for direct modification
-    root_text = modified_ast["text"]
+    # byte positions index into utf-8 encoded source (not into python string)
+    # memoryview -> unchanged slices aren't copied until final join
+    source = memoryview(ast_node["text"].encode("utf-8"))
+    base = ast_node["start_byte"]
     
-    # process transformations in reverse order (to avoid position shifting issues)
-    for expr in sorted(expressions, key=lambda x: x["start_byte"], reverse=True):
-        # get original expression and its position
-        start_pos = expr["start_byte"]
-        end_pos = expr["end_byte"]
+    # unchanged slices and reversed expressions in source order, joined once at the end
+    # (expressions are found in source order)
+    parts = []
+    cursor = 0
+    for expr in expressions:
+        start_pos = expr["start_byte"] - base
         
-        # create reversed expression
-        reversed_expr = create_reversed_expression(expr)
+        # relational expression nested in one that's already reversed -> reversed text of outer one
+        # is built from original operand text, so it replaces the inner one
+        if start_pos < cursor:
+            continue
         
-        # replace in root text
-        root_text = root_text[:start_pos] + reversed_expr + root_text[end_pos:]
-    
-    # update root text with all transformations applied
-    modified_ast["text"] = root_text
+        # create reversed expression
+        parts.append(source[cursor:start_pos])
+        parts.append(create_reversed_expression(expr).encode("utf-8"))
+        cursor = expr["end_byte"] - base
+    parts.append(source[cursor:])
     
-    return modified_ast
+    # shallow copy - children are shared with the input AST (only root text is used downstream)
+    return {**ast_node, "text": b"".join(parts).decode("utf-8")}
 
 def transform_file(input_ast_path, output_ast_path):
     try:
-        # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast_bytes = Path(input_ast_path).read_bytes()
+        
+        # no relational operator token (or no binary expression) anywhere in raw json
+        # -> nothing to transform, file is copied as is without parsing it
+        # (may also match e.g. template brackets or string literals - then file is just transformed as usual)
+        if (b'"binary_expression"' not in ast_bytes
+                or not any(marker in ast_bytes for marker in RELATIONAL_OPERATOR_MARKERS)):
+            Path(output_ast_path).write_bytes(ast_bytes)
+            return
+        
+        # Load AST
+        ast = restore_ast(orjson.loads(ast_bytes))
         
         # Apply transformation
         modified_ast = transform_relational_expressions(ast)
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
             
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
@@ -332,12 +341,18 @@ def transform_directory(input_dir, output_dir):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Process each AST file in input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path)
+    # collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+    
+    # files are independent -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(transform_file, input_paths, output_paths, chunksize=32))
 
 def apply_relational_transformation(input_dir, output_dir):
     transform_directory(input_dir, output_dir)
\ No newline at end of file
@@ -1,36 +1,16 @@
 # Sofia Deichert - Code Transformation Project
 # ch-rename: function name and variable renaming
 
-import json
-import copy
 import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-# transforms all function and variable names
-def transform_names(ast_node):
-    # deep copy to avoid modifying original
-    modified_ast = copy.deepcopy(ast_node)
-    
-    # find all identifier nodes that need renaming
-    identifiers = find_identifiers(modified_ast)
-    
-    # nothing to change
-    if not identifiers:
-        return modified_ast
-    
-    # get root text - modify this directly
-    root_text = modified_ast["text"]
-    
-    # process transformations in reverse order (to avoid position shifting issues)
-    # sort by start position so deeper nested identifiers get renamed first
-    for identifier in sorted(identifiers, key=lambda x: x["start_byte"], reverse=True):
-        # get original name and positions
-        original_name = identifier["text"]
-        start_pos = identifier["start_byte"]
-        end_pos = identifier["end_byte"]
-        
-        # skip standard library functions and keywords
-        if original_name in [
-        
+import orjson
+
+from transformations.ast_io import restore_ast, save_ast
+
+# standard library functions and keywords (never renamed)
+RESERVED_NAMES = frozenset({
     # C/C++ keywords
     "alignas", "alignof", "and", "and_eq", "asm", "auto", "bitand", "bitor", "bool", "break", 
     "case", "catch", "char", "char8_t", "char16_t", "char32_t", "class", "compl", "concept", 
@@ -140,49 +120,104 @@ def transform_names(ast_node):
     "unique_lock", "shared_lock", "condition_variable", "condition_variable_any", "notify_all_at_thread_exit",
     "cv_status", "promise", "packaged_task", "future", "shared_future", "async", "launch", "future_status",
     "future_error", "future_category"
-]:
-            continue
-            
-        # create new name
-        new_name = original_name + '_new'
-        
-        # replace in root text
-        root_text = root_text[:start_pos] + new_name + root_text[end_pos:]
+})
+
+# transforms all function and variable names
+def transform_names(ast_node):
+    # AST is only read - find all identifier nodes that need renaming
+    identifiers = find_identifiers(ast_node)
     
-    # update AST root text with all transformations applied
-    modified_ast["text"] = root_text
+    # nothing to change
+    if not identifiers:
+        return ast_node
     
-    return modified_ast
+    # shallow copy - children are shared with the input AST (only root text is used downstream)
+    spans = [(identifier["start_byte"], identifier["end_byte"], identifier["text"]) for identifier in identifiers]
+    return {**ast_node, "text": rename_identifiers(ast_node["text"], ast_node["start_byte"], spans)}
 
-# recursively find all identifier nodes that should be renamed
-def find_identifiers(ast_node, results=None):
-    if results is None:
-        results = []
+# transforms all function and variable names in flat node table (as written by extract_ast.py)
+# identifiers are picked out of types list directly -> nested AST is never built
+def transform_names_table(ast_table):
+    types, starts, ends = ast_table["types"], ast_table["starts"], ast_table["ends"]
+    base = starts[0]
     
-    # check if this node is an identifier that should be renamed
-    if ast_node["type"] == "identifier":
-        # add to results
-        results.append(ast_node)
+    # byte positions index into utf-8 encoded source (not into python string)
+    source = ast_table["text"].encode("utf-8")
+    
+    # nodes are stored in pre-order -> identifiers come out in source order
+    spans = [
+        (starts[index], ends[index], source[starts[index] - base:ends[index] - base].decode("utf-8"))
+        for index, node_type in enumerate(types) if node_type == "identifier"
+    ]
+    
+    # nothing to change
+    if not spans:
+        return ast_table
     
-    # recursively search children
-    for child in ast_node.get("children", []):
-        find_identifiers(child, results)
+    # node positions are left as they are (like children of transformed nested ASTs, only root text is used downstream)
+    return {**ast_table, "text": rename_identifiers(ast_table["text"], base, spans)}
+
+# build root text with '_new' appended to every identifier that isn't reserved
+# spans: (start_byte, end_byte, name) of identifiers in source order
+def rename_identifiers(text, base, spans):
+    # byte positions index into utf-8 encoded source (not into python string)
+    # memoryview -> unchanged slices aren't copied until final join
+    source = memoryview(text.encode("utf-8"))
+    
+    # unchanged slices and new names in source order, joined once at the end
+    # (identifiers are never nested)
+    parts = []
+    cursor = 0
+    for start_byte, end_byte, original_name in spans:
+        # skip standard library functions and keywords
+        if original_name in RESERVED_NAMES:
+            continue
+            
+        # create new name (original name + '_new' -> only suffix is inserted after it)
+        end_pos = end_byte - base
+        parts.append(source[cursor:end_pos])
+        parts.append(b'_new')
+        cursor = end_pos
+    parts.append(source[cursor:])
+    
+    return b"".join(parts).decode("utf-8")
+
+# find all identifier nodes that should be renamed (in source order)
+def find_identifiers(ast_node):
+    results = []
+    
+    # explicit stack instead of recursion (deep ASTs hit recursion limit)
+    # children pushed in reverse -> nodes visited in source order
+    stack = [ast_node]
+    while stack:
+        node = stack.pop()
+        
+        # check if this node is an identifier that should be renamed
+        if node["type"] == "identifier":
+            # add to results
+            results.append(node)
+        
+        children = node.get("children", ())
+        if children:
+            stack.extend(reversed(children))
     
     return results
 
 # transforms single AST file, renaming all variables and functions
 def transform_file(input_ast_path, output_ast_path):
     try:
-        # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        # Load AST json from file
+        ast_json = orjson.loads(Path(input_ast_path).read_bytes())
         
         # Apply transformation
-        modified_ast = transform_names(ast)
+        # (node table from extract_ast.py is renamed directly, transformed nested ASTs are restored first)
+        if "types" in ast_json:
+            modified_ast = transform_names_table(ast_json)
+        else:
+            modified_ast = transform_names(restore_ast(ast_json))
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
                     
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
@@ -194,12 +229,18 @@ def transform_directory(input_dir, output_dir):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Process each AST file in input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            transform_file(input_path, output_path)
+    # collect (input, output) paths of each AST file in input directory
+    input_paths = []
+    output_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                input_paths.append(entry.path)
+                output_paths.append(os.path.join(output_dir, entry.name))
+    
+    # files are independent -> spread them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(transform_file, input_paths, output_paths, chunksize=32))
 
 
 def apply_ch_rename_transformation(input_dir, output_dir):
@@ -1,10 +1,11 @@
 # Sofia Deichert - Code Transformation Project
 # C++14 transformation for return type deduction with auto
 
-import json
 import copy
 import os
 
+from transformations.ast_io import load_ast, save_ast
+
 def transform_return_type_to_auto(ast_node):
     """
     Transforms function return types to 'auto' according to C++14 feature
@@ -166,15 +167,13 @@ def transform_file(input_ast_path, output_ast_path):
     """
     try:
         # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         # Apply transformation
         modified_ast, _ = transform_return_type_to_auto(ast)
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
             
         # print(f"Transformed {input_ast_path} -> {output_ast_path}")
         
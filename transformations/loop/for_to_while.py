@@ -2,10 +2,11 @@
 # R1-loop: equivalent transformation among for structure and while structure
 # (2) for loop → while loop
 
-import json
 import copy
 import os
 
+from transformations.ast_io import load_ast, save_ast
+
 def transform_for_to_while(ast_node):
     """
     Transform for loops into equivalent while loops:
@@ -244,8 +245,7 @@ def transform_file(input_ast_path, output_ast_path):
     """
     try:
         # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         # Apply transformation
         modified_ast = transform_for_to_while(ast)
@@ -254,8 +254,7 @@ def transform_file(input_ast_path, output_ast_path):
         modified_ast = remove_trailing_spaces_before_braces(modified_ast)
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
         
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")
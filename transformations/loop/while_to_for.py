@@ -2,10 +2,11 @@
 # R1-loop: equivalent transformation among for structure and while structure
 # (1) while loop → for loop
 
-import json
 import os
 import re
 
+from transformations.ast_io import load_ast, save_ast
+
 def transform_while_to_for(ast_json):
     """
     Transforms while loops to for loops by modifying text directly.
@@ -92,15 +93,13 @@ def transform_file(input_ast_path, output_ast_path):
     """
     try:
         # Load AST from file
-        with open(input_ast_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
+        ast = load_ast(input_ast_path)
         
         # Apply transformation
         modified_ast = transform_while_to_for(ast)
         
         # Save modified AST
-        with open(output_ast_path, 'w', encoding='utf-8') as f:
-            json.dump(modified_ast, f, indent=2)
+        save_ast(modified_ast, output_ast_path)
         
     except Exception as e:
         print(f"Error transforming {input_ast_path}: {e}")